@@ -1,12 +1,23 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, Response
 from flask_cors import CORS
 from flask_mail import Mail, Message
-import json
+import click
+import hmac
 import os
-from datetime import datetime
+import threading
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+import codec
+import profiling
+from archive import archive_alerts, iter_archived_alerts, parse_alert_date
+from mailer import build_sender_pool
+from webhook import WebhookDispatcher, build_alert_event, check_webhook_url
 
 app = Flask(__name__)
+app.json = codec.CodecJSONProvider(app)
 CORS(app)
+profiling.init_app(app)
 
 # Email Configuration - Update these with your actual email credentials
 app.config['MAIL_SERVER'] = 'smtp.gmail.com'
@@ -16,14 +27,60 @@ app.config['MAIL_USERNAME'] = os.environ.get('EMAIL_USER', 'your_email@gmail.com
 app.config['MAIL_PASSWORD'] = os.environ.get('EMAIL_PASSWORD', 'your_app_password')  # Set EMAIL_PASSWORD environment variable
 app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('EMAIL_USER', 'your_email@gmail.com')
 
+# Flask-Mail still renders Message objects and owns MAIL_SUPPRESS_SEND and the
+# email_dispatched signal; delivery itself goes through sender_pool below
 mail = Mail(app)
 
+# Rate-limited delivery across EMAIL_USER plus any extra EMAIL_ACCOUNTS ("user:pass,user2:pass2")
+sender_pool = build_sender_pool(app.config)
+
+# Batched, signed HTTP delivery for alerts that set a 'webhook' URL. Results
+# come back once per batch; the late lookup lets the replay harness swap the recorder.
+webhook_dispatcher = WebhookDispatcher(
+    on_result=lambda events, delivered: record_webhook_results(events, delivered))
+# Seconds a queued webhook may go unconfirmed before a sweep queues it again
+WEBHOOK_PENDING_TIMEOUT = int(os.environ.get('WEBHOOK_PENDING_TIMEOUT', '300'))
+
+# Serialises read-modify-write cycles on db.json across request threads
+db_lock = threading.RLock()
+
+def new_alert_id():
+    return uuid.uuid4().hex
+
+def assign_alert_ids(db):
+    """Give legacy alerts an id; returns True if any were added"""
+    changed = False
+    for alert in db.get('alerts', []):
+        if not alert.get('id'):
+            alert['id'] = new_alert_id()
+            changed = True
+    return changed
+
+# Stored with the alert but never sent back out through the API
+PRIVATE_ALERT_FIELDS = ('webhook_secret',)
+
+def public_alert(alert):
+    """Copy of an alert that is safe to return to clients"""
+    return {key: value for key, value in alert.items() if key not in PRIVATE_ALERT_FIELDS}
+
+def current_time():
+    """Wall clock used for alert timestamps; the replay harness swaps in a virtual clock"""
+    return datetime.now()
+
 DB_PATH = os.path.join(os.path.dirname(__file__), 'db.json')
+# db.json is written compactly; set DB_PRETTY=1 to keep it human-readable
+DB_PRETTY = os.environ.get('DB_PRETTY', '').lower() in ('1', 'true', 'yes')
+
+# Most archived history /get-alerts?include_archived=1 returns: a window of recent
+# days (segments outside it are skipped via the index) and a row cap within it.
+# Older history stays available through /get-alert-history.
+DASHBOARD_ARCHIVE_DAYS = int(os.environ.get('DASHBOARD_ARCHIVE_DAYS', '30'))
+DASHBOARD_ARCHIVE_LIMIT = int(os.environ.get('DASHBOARD_ARCHIVE_LIMIT', '1000'))
 
+@profiling.timed('load_db')
 def load_db():
     try:
-        with open(DB_PATH, 'r') as f:
-            return json.load(f)
+        return codec.load_file(DB_PATH)
     except FileNotFoundError:
         # Create default database structure if file doesn't exist
         default_db = {
@@ -31,23 +88,116 @@ def load_db():
             "users": [],
             "feedback": []
         }
-        save_db(default_db)
+        with db_lock:
+            save_db(default_db)
         return default_db
-    except json.JSONDecodeError:
+    except codec.DecodeError:
         print("Error: Invalid JSON in database file")
         return {"alerts": [], "users": [], "feedback": []}
     except Exception as e:
         print(f"Error loading database: {e}")
         return {"alerts": [], "users": [], "feedback": []}
 
+@profiling.timed('save_db')
 def save_db(data):
     try:
-        with open(DB_PATH, 'w') as f:
-            json.dump(data, f, indent=2)
+        codec.dump_file(data, DB_PATH, pretty=DB_PRETTY)
     except Exception as e:
         print(f"Error saving database: {e}")
         raise
 
+def export_db(path):
+    """Write a pretty-printed copy of the database, e.g. for inspection or backups"""
+    codec.dump_file(load_db(), path, pretty=True)
+
+@app.cli.command('export-db')
+@click.argument('path')
+def export_db_command(path):
+    """Export db.json to PATH as pretty-printed JSON (flask --app app export-db PATH)"""
+    with db_lock:
+        export_db(path)
+    print(f"💾 Database exported to {os.path.abspath(path)}")
+
+@profiling.timed('render_alert_email')
+def render_alert_email(alert_type, threshold_value, current_value):
+    """Build the subject line and HTML body for a smart alert email"""
+    # Calculate severity and urgency
+    severity, urgency, recommendations = analyze_alert_severity(alert_type, threshold_value, current_value)
+    
+    # Priority-based subject line
+    priority_emoji = "🔴" if urgency == "CRITICAL" else "🟡" if urgency == "HIGH" else "🟢"
+    subject = f"{priority_emoji} URGENT: {alert_type.replace('_', ' ').title()} Alert - {urgency} Priority"
+    
+    # Smart recommendations based on severity
+    smart_recommendations = get_smart_recommendations(alert_type, threshold_value, current_value, severity)
+    
+    # Time-based urgency
+    time_context = get_time_context()
+    
+    message_body = f"""
+    <html>
+    <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+        <div style="max-width: 600px; margin: 0 auto; padding: 20px; border: 2px solid {'#dc2626' if urgency == 'CRITICAL' else '#f59e0b' if urgency == 'HIGH' else '#10b981'}; border-radius: 8px;">
+            <div style="background: {'linear-gradient(135deg, #dc2626, #b91c1c)' if urgency == 'CRITICAL' else 'linear-gradient(135deg, #f59e0b, #d97706)' if urgency == 'HIGH' else 'linear-gradient(135deg, #10b981, #059669)'}; color: white; padding: 15px; border-radius: 6px; margin-bottom: 20px;">
+                <h2 style="margin: 0; font-size: 24px;">🚨 {alert_type.replace('_', ' ').title()} Alert</h2>
+                <p style="margin: 5px 0 0 0; font-size: 16px;">{urgency} Priority - Immediate Action Required</p>
+            </div>
+            
+            <div style="background-color: #fef2f2; border-left: 4px solid #dc2626; padding: 15px; margin: 20px 0; border-radius: 4px;">
+                <h3 style="color: #dc2626; margin: 0 0 10px 0;">⚠️ CRITICAL ISSUE DETECTED</h3>
+                <p style="margin: 0; font-weight: bold;">Your system has crossed the threshold limit and needs immediate attention!</p>
+            </div>
+            
+            <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 20px; margin: 20px 0;">
+                <div style="background-color: #f8fafc; padding: 15px; border-radius: 6px;">
+                    <h4 style="margin: 0 0 10px 0; color: #374151;">📊 Alert Details</h4>
+                    <p><strong>Type:</strong> {alert_type.replace('_', ' ').title()}</p>
+                    <p><strong>Threshold:</strong> {threshold_value}</p>
+                    <p><strong>Current Value:</strong> <span style="color: #dc2626; font-weight: bold;">{current_value}</span></p>
+                    <p><strong>Severity:</strong> <span style="color: {'#dc2626' if severity == 'HIGH' else '#f59e0b' if severity == 'MEDIUM' else '#10b981'}; font-weight: bold;">{severity}</span></p>
+                    <p><strong>Time:</strong> {current_time().strftime('%Y-%m-%d %H:%M:%S')}</p>
+                </div>
+                
+                <div style="background-color: #f8fafc; padding: 15px; border-radius: 6px;">
+                    <h4 style="margin: 0 0 10px 0; color: #374151;">⚡ Urgency Level</h4>
+                    <p><strong>Priority:</strong> <span style="color: #dc2626; font-weight: bold;">{urgency}</span></p>
+                    <p><strong>Response Time:</strong> {get_response_time(urgency)}</p>
+                    <p><strong>Impact:</strong> {get_impact_assessment(alert_type, severity)}</p>
+                    <p><strong>Time Context:</strong> {time_context}</p>
+                </div>
+            </div>
+            
+            <div style="background-color: #fef3c7; border: 1px solid #f59e0b; padding: 20px; border-radius: 6px; margin: 20px 0;">
+                <h3 style="color: #92400e; margin: 0 0 15px 0;">🎯 IMMEDIATE ACTION REQUIRED</h3>
+                <div style="background-color: white; padding: 15px; border-radius: 4px;">
+                    <p style="margin: 0 0 10px 0; font-weight: bold; color: #dc2626;">What needs to be fixed ASAP:</p>
+                    {smart_recommendations}
+                </div>
+            </div>
+            
+            <div style="background-color: #ecfdf5; border: 1px solid #10b981; padding: 15px; border-radius: 6px; margin: 20px 0;">
+                <h4 style="color: #065f46; margin: 0 0 10px 0;">📋 Step-by-Step Resolution</h4>
+                {get_step_by_step_resolution(alert_type, severity)}
+            </div>
+            
+            <div style="background-color: #f3f4f6; padding: 15px; border-radius: 6px; margin: 20px 0;">
+                <h4 style="margin: 0 0 10px 0; color: #374151;">🔗 Quick Actions</h4>
+                <p style="margin: 0 0 10px 0;">• <strong>Dashboard:</strong> <a href="http://127.0.0.1:5000/dashboard.html" style="color: #3b82f6;">View Real-time Status</a></p>
+                <p style="margin: 0 0 10px 0;">• <strong>Settings:</strong> <a href="http://127.0.0.1:5000/settings.html" style="color: #3b82f6;">Adjust Alert Thresholds</a></p>
+                <p style="margin: 0 0 10px 0;">• <strong>Support:</strong> Contact your system administrator immediately</p>
+            </div>
+            
+            <div style="text-align: center; margin-top: 30px; padding-top: 20px; border-top: 1px solid #e5e7eb;">
+                <p style="color: #6b7280; font-size: 12px; margin: 0;">🚨 This is an automated critical alert from AutoAlert Pro</p>
+                <p style="color: #6b7280; font-size: 12px; margin: 5px 0 0 0;">Response time: {get_response_time(urgency)} | Severity: {severity}</p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+    
+    return subject, message_body, urgency
+
 def send_alert_email(recipient_email, alert_type, threshold_value, current_value):
     """Send smart alert email with intelligent recommendations"""
     try:
@@ -64,80 +214,8 @@ def send_alert_email(recipient_email, alert_type, threshold_value, current_value
         print(f"📧 Attempting to send email to: {recipient_email}")
         print(f"📧 Using email: {app.config['MAIL_USERNAME']}")
         
-        # Calculate severity and urgency
-        severity, urgency, recommendations = analyze_alert_severity(alert_type, threshold_value, current_value)
-        
-        # Priority-based subject line
-        priority_emoji = "🔴" if urgency == "CRITICAL" else "🟡" if urgency == "HIGH" else "🟢"
-        subject = f"{priority_emoji} URGENT: {alert_type.replace('_', ' ').title()} Alert - {urgency} Priority"
-        
-        # Smart recommendations based on severity
-        smart_recommendations = get_smart_recommendations(alert_type, threshold_value, current_value, severity)
-        
-        # Time-based urgency
-        time_context = get_time_context()
-        
-        message_body = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-            <div style="max-width: 600px; margin: 0 auto; padding: 20px; border: 2px solid {'#dc2626' if urgency == 'CRITICAL' else '#f59e0b' if urgency == 'HIGH' else '#10b981'}; border-radius: 8px;">
-                <div style="background: {'linear-gradient(135deg, #dc2626, #b91c1c)' if urgency == 'CRITICAL' else 'linear-gradient(135deg, #f59e0b, #d97706)' if urgency == 'HIGH' else 'linear-gradient(135deg, #10b981, #059669)'}; color: white; padding: 15px; border-radius: 6px; margin-bottom: 20px;">
-                    <h2 style="margin: 0; font-size: 24px;">🚨 {alert_type.replace('_', ' ').title()} Alert</h2>
-                    <p style="margin: 5px 0 0 0; font-size: 16px;">{urgency} Priority - Immediate Action Required</p>
-                </div>
-                
-                <div style="background-color: #fef2f2; border-left: 4px solid #dc2626; padding: 15px; margin: 20px 0; border-radius: 4px;">
-                    <h3 style="color: #dc2626; margin: 0 0 10px 0;">⚠️ CRITICAL ISSUE DETECTED</h3>
-                    <p style="margin: 0; font-weight: bold;">Your system has crossed the threshold limit and needs immediate attention!</p>
-                </div>
-                
-                <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 20px; margin: 20px 0;">
-                    <div style="background-color: #f8fafc; padding: 15px; border-radius: 6px;">
-                        <h4 style="margin: 0 0 10px 0; color: #374151;">📊 Alert Details</h4>
-                        <p><strong>Type:</strong> {alert_type.replace('_', ' ').title()}</p>
-                        <p><strong>Threshold:</strong> {threshold_value}</p>
-                        <p><strong>Current Value:</strong> <span style="color: #dc2626; font-weight: bold;">{current_value}</span></p>
-                        <p><strong>Severity:</strong> <span style="color: {'#dc2626' if severity == 'HIGH' else '#f59e0b' if severity == 'MEDIUM' else '#10b981'}; font-weight: bold;">{severity}</span></p>
-                        <p><strong>Time:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-                    </div>
-                    
-                    <div style="background-color: #f8fafc; padding: 15px; border-radius: 6px;">
-                        <h4 style="margin: 0 0 10px 0; color: #374151;">⚡ Urgency Level</h4>
-                        <p><strong>Priority:</strong> <span style="color: #dc2626; font-weight: bold;">{urgency}</span></p>
-                        <p><strong>Response Time:</strong> {get_response_time(urgency)}</p>
-                        <p><strong>Impact:</strong> {get_impact_assessment(alert_type, severity)}</p>
-                        <p><strong>Time Context:</strong> {time_context}</p>
-                    </div>
-                </div>
-                
-                <div style="background-color: #fef3c7; border: 1px solid #f59e0b; padding: 20px; border-radius: 6px; margin: 20px 0;">
-                    <h3 style="color: #92400e; margin: 0 0 15px 0;">🎯 IMMEDIATE ACTION REQUIRED</h3>
-                    <div style="background-color: white; padding: 15px; border-radius: 4px;">
-                        <p style="margin: 0 0 10px 0; font-weight: bold; color: #dc2626;">What needs to be fixed ASAP:</p>
-                        {smart_recommendations}
-                    </div>
-                </div>
-                
-                <div style="background-color: #ecfdf5; border: 1px solid #10b981; padding: 15px; border-radius: 6px; margin: 20px 0;">
-                    <h4 style="color: #065f46; margin: 0 0 10px 0;">📋 Step-by-Step Resolution</h4>
-                    {get_step_by_step_resolution(alert_type, severity)}
-                </div>
-                
-                <div style="background-color: #f3f4f6; padding: 15px; border-radius: 6px; margin: 20px 0;">
-                    <h4 style="margin: 0 0 10px 0; color: #374151;">🔗 Quick Actions</h4>
-                    <p style="margin: 0 0 10px 0;">• <strong>Dashboard:</strong> <a href="http://127.0.0.1:5000/dashboard.html" style="color: #3b82f6;">View Real-time Status</a></p>
-                    <p style="margin: 0 0 10px 0;">• <strong>Settings:</strong> <a href="http://127.0.0.1:5000/settings.html" style="color: #3b82f6;">Adjust Alert Thresholds</a></p>
-                    <p style="margin: 0 0 10px 0;">• <strong>Support:</strong> Contact your system administrator immediately</p>
-                </div>
-                
-                <div style="text-align: center; margin-top: 30px; padding-top: 20px; border-top: 1px solid #e5e7eb;">
-                    <p style="color: #6b7280; font-size: 12px; margin: 0;">🚨 This is an automated critical alert from AutoAlert Pro</p>
-                    <p style="color: #6b7280; font-size: 12px; margin: 5px 0 0 0;">Response time: {get_response_time(urgency)} | Severity: {severity}</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+        # Build subject and HTML body with severity-based recommendations
+        subject, message_body, urgency = render_alert_email(alert_type, threshold_value, current_value)
         
         msg = Message(
             subject=subject,
@@ -146,7 +224,11 @@ def send_alert_email(recipient_email, alert_type, threshold_value, current_value
         )
         
         print(f"📧 Sending email with subject: {subject}")
-        mail.send(msg)
+        with profiling.span('mail.send'):
+            email_sent = sender_pool.send(msg)
+        if not email_sent:
+            print(f"❌ Email to {recipient_email} was not delivered (rate limited or refused)")
+            return False
         print(f"✅ Smart alert email sent successfully to {recipient_email} - {urgency} priority")
         return True
         
@@ -157,7 +239,132 @@ def send_alert_email(recipient_email, alert_type, threshold_value, current_value
         return False
 
 
+def notify_webhook(alert, threshold_value, current_value):
+    """Queue a webhook event for a triggered alert that has a webhook URL configured.
+
+    The outcome arrives later, per batch, through record_webhook_results().
+    """
+    webhook_url = alert.get('webhook')
+    if not webhook_url:
+        return False
+    try:
+        severity, urgency, _ = analyze_alert_severity(alert['type'], threshold_value, current_value)
+        event = build_alert_event(alert, threshold_value, current_value, severity, urgency,
+                                  triggered_at=current_time())
+        webhook_dispatcher.enqueue(webhook_url, event, secret=alert.get('webhook_secret'))
+        print(f"🔗 Webhook event queued for {webhook_url}")
+        return True
+    except Exception as e:
+        print(f"❌ Error queueing webhook: {str(e)}")
+        return False
+
+def is_alert_triggered(alert_type, threshold_value, current_value):
+    """Whether current_value crosses the threshold; None for alert types that are not monitored"""
+    if alert_type == 'traffic_drop':
+        return current_value < threshold_value
+    elif alert_type == 'site_down':
+        return current_value > threshold_value
+    return None
+
+def record_webhook_results(events, delivered):
+    """Dispatcher callback: store one batch's outcome on its alerts in a single save"""
+    alert_ids = {event.get('alert_id') for event in events if event.get('alert_id')}
+    if not alert_ids:
+        return
+    try:
+        with db_lock:
+            db = load_db()
+            changed = False
+            for alert in db.get('alerts', []):
+                if alert.get('id') in alert_ids:
+                    update_alert_delivery(alert, 'webhook', delivered)
+                    changed = True
+            if changed:
+                save_db(db)
+    except Exception as e:
+        print(f"❌ Error recording webhook results: {str(e)}")
+
+def alert_channels(alert):
+    return ['email', 'webhook'] if alert.get('webhook') else ['email']
+
+def update_alert_delivery(alert, channel, delivered):
+    """Record one channel's outcome; the alert only counts as sent once every channel is"""
+    alert[f'{channel}_status'] = 'sent' if delivered else 'failed'
+    if all(alert.get(f'{name}_status') == 'sent' for name in alert_channels(alert)):
+        alert['status'] = 'Alert Sent'
+
+def reset_alert_delivery(alert):
+    """Re-arm an alert so its next trigger notifies on every channel again"""
+    alert['status'] = 'Normal'
+    for name in ('email', 'webhook'):
+        alert.pop(f'{name}_status', None)
+    alert.pop('webhook_queued_at', None)
+
+def webhook_in_flight(alert):
+    """Whether a queued webhook for this alert may still be confirmed"""
+    if alert.get('webhook_status') != 'pending':
+        return False
+    queued_at = parse_alert_date(alert.get('webhook_queued_at'))
+    return queued_at is not None and (current_time() - queued_at).total_seconds() < WEBHOOK_PENDING_TIMEOUT
+
+# Triggered alerts are handled in three steps so db_lock is never held while
+# sending: claim_alert_channels() and apply_alert_outcomes() run under the lock
+# around a load/save, send_alert_notifications() runs outside it.
 
+def claim_alert_channels(alert, current_value):
+    """Pick the channels a triggered alert still needs (caller holds db_lock).
+
+    A webhook is marked 'pending' here, before it is queued, so its result can
+    never reach the store ahead of the claim and be overwritten by it.
+    """
+    alert['current_value'] = current_value
+    alert['last_checked'] = current_time().isoformat()
+    channels = []
+    if alert.get('email_status') != 'sent':
+        channels.append('email')
+    if 'webhook' in alert_channels(alert) and alert.get('webhook_status') != 'sent' and not webhook_in_flight(alert):
+        alert['webhook_status'] = 'pending'
+        alert['webhook_queued_at'] = current_time().isoformat()
+        channels.append('webhook')
+    return channels
+
+def send_alert_notifications(alert, channels, threshold_value, current_value):
+    """Send the email and queue the webhook for claimed channels; returns {channel: ok}"""
+    outcomes = {}
+    if 'email' in channels:
+        outcomes['email'] = send_alert_email(
+            alert['email'],
+            alert['type'],
+            threshold_value,
+            current_value
+        )
+    if 'webhook' in channels:
+        outcomes['webhook'] = notify_webhook(alert, threshold_value, current_value)
+    return outcomes
+
+def apply_alert_outcomes(alert, outcomes):
+    """Record what send_alert_notifications() did (caller holds db_lock).
+
+    Email is confirmed on return; a queued webhook stays 'pending' until the
+    dispatcher reports back. The alert becomes 'Alert Sent' only when all of
+    its channels are confirmed, so failed channels are retried by the next sweep.
+    """
+    if 'email' in outcomes:
+        update_alert_delivery(alert, 'email', outcomes['email'])
+    if outcomes.get('webhook') is False:
+        update_alert_delivery(alert, 'webhook', False)
+
+def dispatch_alert(alert, threshold_value, current_value):
+    """Claim, send and apply in one go for an alert nothing else is writing.
+
+    Returns (email_sent, webhook_queued).
+    """
+    channels = claim_alert_channels(alert, current_value)
+    outcomes = send_alert_notifications(alert, channels, threshold_value, current_value)
+    apply_alert_outcomes(alert, outcomes)
+    return outcomes.get('email', False), outcomes.get('webhook', False)
+
+@profiling.timed('analyze_alert_severity')
 def analyze_alert_severity(alert_type, threshold_value, current_value):
     """Analyze alert severity and provide intelligent recommendations"""
     threshold = int(threshold_value)
@@ -348,7 +555,7 @@ def get_impact_assessment(alert_type, severity):
 
 def get_time_context():
     """Get time-based context for urgency"""
-    current_hour = datetime.now().hour
+    current_hour = current_time().hour
     if 9 <= current_hour <= 17:
         return "Business Hours - High Impact"
     elif 18 <= current_hour <= 22:
@@ -373,9 +580,22 @@ def set_alert():
             if not data.get(field):
                 return jsonify({'message': f'Missing required field: {field}'}), 400
         
+        # Optional webhook channel, used alongside email
+        if data.get('webhook'):
+            problem = check_webhook_url(data['webhook'])
+            if problem:
+                return jsonify({'message': f'Invalid webhook URL: {problem}'}), 400
+        
+        try:
+            data = codec.to_record('alert', data)
+        except codec.ValidationError as e:
+            return jsonify({'message': f'Invalid alert: {e}'}), 400
+        
+        data['id'] = new_alert_id()
+        
         # Add timestamp if not provided
         if 'date' not in data:
-            data['date'] = datetime.now().isoformat()
+            data['date'] = current_time().isoformat()
         
         # Add default status
         if 'status' not in data:
@@ -396,45 +616,51 @@ def set_alert():
             current_value = random.randint(100, 500)
         
         # Check if threshold is exceeded
-        alert_triggered = False
-        if data['type'] == 'traffic_drop' and current_value < threshold_value:
-            alert_triggered = True
-        elif data['type'] == 'site_down' and current_value > threshold_value:
-            alert_triggered = True
+        alert_triggered = bool(is_alert_triggered(data['type'], threshold_value, current_value))
         
-        # Update status and send notifications if alert is triggered
-        if alert_triggered:
-            data['status'] = 'Alert Sent'
-            data['current_value'] = current_value
-            
-            # Send email notification
-            email_sent = send_alert_email(
-                data['email'], 
-                data['type'], 
-                threshold_value, 
-                current_value
-            )
+        data['status'] = 'Normal'
+        data['current_value'] = current_value
+        email_sent = webhook_queued = False
+        
+        channels = claim_alert_channels(data, current_value) if alert_triggered else []
+        
+        # Saved before sending so a fast webhook result finds the alert on disk
+        with db_lock:
+            db = load_db()
+            db['alerts'].append(data)
+            save_db(db)
+        
+        # Send notifications if alert is triggered; status follows what was delivered
+        if channels:
+            outcomes = send_alert_notifications(data, channels, threshold_value, current_value)
+            email_sent = outcomes.get('email', False)
+            webhook_queued = outcomes.get('webhook', False)
             if email_sent:
                 print(f"Alert email sent to {data['email']}")
             else:
                 print(f"Failed to send alert email to {data['email']}")
-            
-
-        else:
-            data['status'] = 'Normal'
-            data['current_value'] = current_value
-        
-        db = load_db()
-        db['alerts'].append(data)
-        save_db(db)
+            with db_lock:
+                db = load_db()
+                for alert in db.get('alerts', []):
+                    if alert.get('id') == data['id']:
+                        apply_alert_outcomes(alert, outcomes)
+                        save_db(db)
+                        break
         
         response_message = 'Alert saved!'
         if alert_triggered:
-            response_message = 'Alert saved and email notification sent!'
+            if email_sent:
+                response_message = 'Alert saved and email notification sent!'
+            else:
+                response_message = 'Alert saved, but the email notification could not be sent; it will be retried'
+            if webhook_queued:
+                response_message += ' Webhook queued.'
         
         return jsonify({
             'message': response_message,
             'alert_triggered': alert_triggered,
+            'email_sent': email_sent,
+            'webhook_queued': webhook_queued,
             'current_value': current_value
         })
     except Exception as e:
@@ -445,12 +671,36 @@ def set_alert():
 def check_alerts():
     """Endpoint to check all active alerts and send emails if thresholds are exceeded"""
     try:
+        return run_alert_sweep()
+    except Exception as e:
+        print(f"Error checking alerts: {e}")
+        return jsonify({'message': 'Failed to check alerts'}), 500
+
+def run_alert_sweep():
+    """One /check-alerts pass.
+
+    db_lock is held to pick triggered alerts and again to record the results,
+    but not while emails are sent, so webhook results and other writers are
+    never stuck behind SMTP.
+    """
+    with db_lock:
         db = load_db()
+        # Ids must be on disk before archiving, since the archive de-duplicates by id
+        if assign_alert_ids(db):
+            save_db(db)
+        
+        # Move resolved alerts past the retention age out of the hot store first and
+        # save straight away. Archiving skips rows a segment already holds, so if this
+        # save fails the next sweep re-archives the same rows without duplicating them.
+        alerts_archived = archive_alerts(db, now=current_time())
+        if alerts_archived > 0:
+            save_db(db)
+        
         alerts = db.get('alerts', [])
         active_alerts = [alert for alert in alerts if alert.get('status') != 'Alert Sent']
         
         alerts_checked = 0
-        emails_sent = 0
+        triggered = []
         
         for alert in active_alerts:
             alerts_checked += 1
@@ -460,51 +710,85 @@ def check_alerts():
             import random
             if alert['type'] == 'traffic_drop':
                 current_value = random.randint(50, 150)
-                alert_triggered = current_value < threshold_value
             elif alert['type'] == 'site_down':
                 current_value = random.randint(100, 500)
-                alert_triggered = current_value > threshold_value
             else:
                 continue
+            alert_triggered = is_alert_triggered(alert['type'], threshold_value, current_value)
             
             if alert_triggered:
-                # Send email
-                email_sent = send_alert_email(
-                    alert['email'],
-                    alert['type'],
-                    threshold_value,
-                    current_value
-                )
-                
-                if email_sent:
-                    emails_sent += 1
-                    alert['status'] = 'Alert Sent'
-                    alert['current_value'] = current_value
-                    alert['last_checked'] = datetime.now().isoformat()
+                channels = claim_alert_channels(alert, current_value)
+                triggered.append((dict(alert), channels, threshold_value, current_value))
         
-        # Save updated alerts
-        if emails_sent > 0:
+        # Save claims (and pending webhooks) before anything is sent
+        if triggered:
             save_db(db)
-        
-        return jsonify({
-            'message': f'Checked {alerts_checked} alerts, sent {emails_sent} emails',
-            'alerts_checked': alerts_checked,
-            'emails_sent': emails_sent
-        })
-        
-    except Exception as e:
-        print(f"Error checking alerts: {e}")
-        return jsonify({'message': 'Failed to check alerts'}), 500
+    
+    emails_sent = 0
+    webhooks_queued = 0
+    results = {}
+    for alert, channels, threshold_value, current_value in triggered:
+        outcomes = send_alert_notifications(alert, channels, threshold_value, current_value)
+        results[alert['id']] = outcomes
+        if outcomes.get('email'):
+            emails_sent += 1
+        if outcomes.get('webhook'):
+            webhooks_queued += 1
+    
+    # Save updated alerts, including channels that failed and will be retried
+    if results:
+        with db_lock:
+            db = load_db()
+            for alert in db.get('alerts', []):
+                if alert.get('id') in results:
+                    apply_alert_outcomes(alert, results[alert['id']])
+            save_db(db)
+    
+    return jsonify({
+        'message': f'Checked {alerts_checked} alerts, sent {emails_sent} emails',
+        'alerts_checked': alerts_checked,
+        'emails_sent': emails_sent,
+        'webhooks_queued': webhooks_queued,
+        'alerts_archived': alerts_archived
+    })
 
 @app.route('/get-alerts', methods=['GET'])
 def get_alerts():
     try:
         db = load_db()
-        return jsonify({'alerts': db.get('alerts', [])})
+        alerts = db.get('alerts', [])
+        # ?include_archived=1 prepends recent archived history (older than anything
+        # still hot); archived_days / archived_limit can narrow the default window
+        if request.args.get('include_archived', '').lower() in ('1', 'true', 'yes'):
+            days = min(max(0, request.args.get('archived_days', DASHBOARD_ARCHIVE_DAYS, type=int)),
+                       DASHBOARD_ARCHIVE_DAYS)
+            limit = min(max(0, request.args.get('archived_limit', DASHBOARD_ARCHIVE_LIMIT, type=int)),
+                        DASHBOARD_ARCHIVE_LIMIT)
+            # Segments stream oldest first; only the newest `limit` rows are held
+            archived = deque(iter_archived_alerts(start=current_time() - timedelta(days=days)), maxlen=limit)
+            alerts = list(archived) + alerts
+        return jsonify({'alerts': [public_alert(alert) for alert in alerts]})
     except Exception as e:
         print(f"Error loading alerts: {e}")
         return jsonify({'alerts': []})
 
+@app.route('/get-alert-history', methods=['GET'])
+def get_alert_history():
+    """Stream archived alerts as NDJSON, optionally filtered by date range, email and type"""
+    start = parse_alert_date(request.args.get('start'))
+    end = parse_alert_date(request.args.get('end'))
+    email = request.args.get('email')
+    alert_type = request.args.get('type')
+
+    def generate():
+        try:
+            for alert in iter_archived_alerts(start=start, end=end, email=email, alert_type=alert_type):
+                yield codec.dumps(public_alert(alert)) + b'\n'
+        except Exception as e:
+            print(f"Error reading alert history: {e}")
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
 @app.route('/login', methods=['POST'])
 def login():
     data = request.get_json()
@@ -523,14 +807,19 @@ def register():
     data = request.get_json()
     email = data.get('email')
     password = data.get('password')
-    db = load_db()
-    # Check if user already exists
-    for user in db.get('users', []):
-        if user['email'] == email:
-            return jsonify({"success": False, "message": "Email already registered."})
-    # Add new user
-    db.setdefault('users', []).append({"email": email, "password": password})
-    save_db(db)
+    try:
+        new_user = codec.to_record('user', {"email": email, "password": password})
+    except codec.ValidationError as e:
+        return jsonify({"success": False, "message": f"Invalid registration: {e}"}), 400
+    with db_lock:
+        db = load_db()
+        # Check if user already exists
+        for user in db.get('users', []):
+            if user['email'] == email:
+                return jsonify({"success": False, "message": "Email already registered."})
+        # Add new user
+        db.setdefault('users', []).append(new_user)
+        save_db(db)
     return jsonify({"success": True, "message": "Registration successful!"})
 
 @app.route('/dashboard.html')
@@ -610,12 +899,13 @@ def get_settings():
 @app.route('/settings', methods=['POST'])
 def update_settings():
     data = request.get_json()
-    db = load_db()
-    if db.get('users'):
-        db['users'][0]['email'] = data.get('email', db['users'][0].get('email', ''))
-        db['users'][0]['notifications'] = data.get('notifications', True)
-        save_db(db)
-        return jsonify({"message": "Settings updated!"})
+    with db_lock:
+        db = load_db()
+        if db.get('users'):
+            db['users'][0]['email'] = data.get('email', db['users'][0].get('email', ''))
+            db['users'][0]['notifications'] = data.get('notifications', True)
+            save_db(db)
+            return jsonify({"message": "Settings updated!"})
     return jsonify({"message": "No user found."}), 400
 @app.route('/settings.html')
 def serve_settings_html():
@@ -623,19 +913,22 @@ def serve_settings_html():
 @app.route('/feedback', methods=['POST'])
 def feedback():
     data = request.json
-    db = load_db()
-    if 'feedback' not in db:
-        db['feedback'] = []
-    
-    feedback_entry = {
-        "type": data.get("type"),
-        "alertId": data.get("alertId"),
-        "rating": data.get("rating"),
-        "text": data.get("text"),
-        "date": datetime.now().isoformat()
-    }
-    db['feedback'].append(feedback_entry)
-    save_db(db)
+    try:
+        feedback_entry = codec.to_record('feedback', {
+            "type": data.get("type"),
+            "alertId": data.get("alertId"),
+            "rating": data.get("rating"),
+            "text": data.get("text"),
+            "date": current_time().isoformat()
+        })
+    except codec.ValidationError as e:
+        return jsonify({"message": f"Invalid feedback: {e}"}), 400
+    with db_lock:
+        db = load_db()
+        if 'feedback' not in db:
+            db['feedback'] = []
+        db['feedback'].append(feedback_entry)
+        save_db(db)
     return jsonify({"message": "Feedback submitted. Thank you!"})
 
 @app.route('/test-email', methods=['POST'])
@@ -677,6 +970,32 @@ def test_email():
         }), 500
 
 
+@app.route('/admin/profiling', methods=['GET', 'POST'])
+def admin_profiling():
+    """Inspect or change profiling at runtime: enable, sample_rate, sweep, dump"""
+    # Disabled unless PROFILING_ADMIN_TOKEN is set; remote_addr alone proves nothing
+    # behind a local reverse proxy. SIGUSR1/SIGUSR2 still work without it.
+    admin_token = os.environ.get('PROFILING_ADMIN_TOKEN')
+    if not admin_token:
+        return jsonify({'message': 'Profiling admin endpoint is disabled; set PROFILING_ADMIN_TOKEN'}), 404
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), admin_token):
+        return jsonify({'message': 'Unauthorized'}), 403
+
+    if request.method == 'GET':
+        return jsonify(profiling.status())
+
+    try:
+        data = request.get_json(silent=True) or {}
+        result = profiling.configure(
+            enabled=data.get('enabled'),
+            sample_rate=data.get('sample_rate'),
+            sweep=data.get('sweep')
+        )
+        if data.get('dump'):
+            result['dumped'] = profiling.dump_spans()
+        return jsonify(result)
+    except (TypeError, ValueError) as e:
+        return jsonify({'message': f'Invalid profiling settings: {e}'}), 400
 
 if __name__ == '__main__':
     app.run(debug=True)
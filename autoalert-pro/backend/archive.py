@@ -0,0 +1,255 @@
+import gzip
+import json
+import os
+import zlib
+from datetime import datetime, timedelta
+
+import codec
+
+# Cold tier for alerts that no longer need to be evaluated. Finished alerts are
+# moved out of db.json into one gzip-compressed NDJSON segment per day, so the
+# hot store (and every load_db/save_db) only carries live alerts.
+ARCHIVE_DIR = os.path.join(os.path.dirname(__file__), 'archive')
+INDEX_PATH = os.path.join(ARCHIVE_DIR, 'index.json')
+
+# Days a resolved alert stays in the hot store before it is archived
+ARCHIVE_RETENTION_DAYS = int(os.environ.get('ARCHIVE_RETENTION_DAYS', '7'))
+
+# Statuses that mean an alert is finished and no longer swept by /check-alerts
+ARCHIVABLE_STATUSES = ('Alert Sent', 'Resolved', 'Inactive')
+
+# Credentials a finished alert no longer needs; they are not carried into history
+ARCHIVE_DROPPED_FIELDS = ('webhook_secret',)
+
+# What reading a truncated or corrupt segment can raise (BadGzipFile is an OSError)
+SEGMENT_READ_ERRORS = (EOFError, OSError, zlib.error) + codec.DecodeError
+
+
+def parse_alert_date(value):
+    """Parse the ISO timestamps stored on alerts ('...Z' or naive local time)"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    # Stored dates mix UTC ('Z') and naive values; compare them all as naive
+    return parsed.replace(tzinfo=None)
+
+
+def last_activity(alert):
+    """Most recent time the alert was touched (last check, else creation)"""
+    return parse_alert_date(alert.get('last_checked')) or parse_alert_date(alert.get('date'))
+
+
+def is_archivable(alert, cutoff):
+    """True if the alert is finished and has been idle since before `cutoff`"""
+    if alert.get('status') not in ARCHIVABLE_STATUSES:
+        return False
+    activity = last_activity(alert)
+    return activity is not None and activity < cutoff
+
+
+def alert_key(alert):
+    """Identity used to keep archiving idempotent; legacy rows without an id fall back to their fields"""
+    if alert.get('id'):
+        return str(alert['id'])
+    return '|'.join(str(alert.get(field, '')) for field in ('date', 'type', 'email', 'value', 'status'))
+
+
+def segment_name(day):
+    return f"alerts-{day.strftime('%Y-%m-%d')}.ndjson.gz"
+
+
+def load_index():
+    """Load the sidecar index, re-indexing any segment it does not match on disk"""
+    try:
+        with open(INDEX_PATH, 'r') as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        index = {"segments": {}}
+    except json.JSONDecodeError:
+        print("Error: Invalid JSON in archive index, rebuilding")
+        return rebuild_index()
+    if _refresh_index(index):
+        save_index(index)
+    return index
+
+
+def save_index(index):
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    tmp_path = INDEX_PATH + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_path, INDEX_PATH)
+
+
+def rebuild_index():
+    """Recreate the sidecar index by scanning every segment on disk"""
+    index = {"segments": {}}
+    _refresh_index(index)
+    save_index(index)
+    return index
+
+
+def _refresh_index(index):
+    """Re-index segments whose size on disk differs from the index (e.g. after a
+    crash between appending and saving the index); returns True if anything changed"""
+    on_disk = {}
+    if os.path.isdir(ARCHIVE_DIR):
+        for name in os.listdir(ARCHIVE_DIR):
+            if name.endswith('.ndjson.gz'):
+                on_disk[name] = os.path.getsize(os.path.join(ARCHIVE_DIR, name))
+    changed = False
+    for name in [n for n in index["segments"] if n not in on_disk]:
+        del index["segments"][name]
+        changed = True
+    for name, size in sorted(on_disk.items()):
+        if index["segments"].get(name, {}).get("size") != size:
+            _reindex_segment(index, name, list(_read_segment(name)))
+            changed = True
+    return changed
+
+
+def _reindex_segment(index, name, rows):
+    index["segments"].pop(name, None)
+    for alert in rows:
+        _update_index_entry(index, name, alert)
+    path = os.path.join(ARCHIVE_DIR, name)
+    if name in index["segments"] and os.path.exists(path):
+        index["segments"][name]["size"] = os.path.getsize(path)
+
+
+def _update_index_entry(index, name, alert):
+    entry = index["segments"].setdefault(name, {
+        "count": 0,
+        "first_date": None,
+        "last_date": None,
+        "types": [],
+        "emails": []
+    })
+    entry["count"] += 1
+    activity = last_activity(alert)
+    if activity is not None:
+        stamp = activity.isoformat()
+        if entry["first_date"] is None or stamp < entry["first_date"]:
+            entry["first_date"] = stamp
+        if entry["last_date"] is None or stamp > entry["last_date"]:
+            entry["last_date"] = stamp
+    if alert.get('type') and alert['type'] not in entry["types"]:
+        entry["types"].append(alert['type'])
+    if alert.get('email') and alert['email'] not in entry["emails"]:
+        entry["emails"].append(alert['email'])
+
+
+def archive_alerts(db, now=None, retention_days=None):
+    """Move finished alerts older than the retention age from `db` into the archive.
+
+    Mutates db['alerts'] in place and returns the number of alerts moved out.
+    The caller is responsible for saving the hot store afterwards. Rows that a
+    segment already holds (e.g. because that save failed last time) are not
+    written again, so re-running after a failure never duplicates history.
+    """
+    now = now or datetime.now()
+    if retention_days is None:
+        retention_days = ARCHIVE_RETENTION_DAYS
+    cutoff = now - timedelta(days=retention_days)
+
+    alerts = db.get('alerts', [])
+    hot, cold = [], []
+    for alert in alerts:
+        (cold if is_archivable(alert, cutoff) else hot).append(alert)
+    if not cold:
+        return 0
+
+    # Group by day of last activity so each segment covers one date partition
+    partitions = {}
+    for alert in cold:
+        partitions.setdefault(segment_name(last_activity(alert)), []).append(alert)
+
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    index = load_index()
+    for name, rows in partitions.items():
+        path = os.path.join(ARCHIVE_DIR, name)
+        damaged = []
+        existing_rows = list(_read_segment(name, damaged)) if os.path.exists(path) else []
+        existing = {alert_key(alert) for alert in existing_rows}
+        rows = [
+            {key: value for key, value in alert.items() if key not in ARCHIVE_DROPPED_FIELDS}
+            for alert in rows if alert_key(alert) not in existing
+        ]
+        if damaged:
+            # Rows appended after a truncated gzip member could never be read back,
+            # so rewrite the segment from what is still intact plus the new rows
+            _write_segment(name, existing_rows + rows)
+        elif rows:
+            # Appending opens a new gzip member; readers see one continuous stream
+            with gzip.open(path, 'ab') as f:
+                for row in rows:
+                    f.write(codec.dumps(row) + b'\n')
+        else:
+            continue
+        # Saved per segment so a crash leaves at most one segment for load_index to re-index
+        _reindex_segment(index, name, existing_rows + rows)
+        save_index(index)
+
+    db['alerts'] = hot
+    print(f"🗄️ Archived {len(cold)} alerts into {len(partitions)} segment(s)")
+    return len(cold)
+
+
+def _read_segment(name, damaged=None):
+    """Yield the rows of one segment. A truncated or corrupt tail ends it early
+    with a warning, and `name` is appended to `damaged` when a list is given."""
+    try:
+        with gzip.open(os.path.join(ARCHIVE_DIR, name), 'rb') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield codec.loads(line)
+    except SEGMENT_READ_ERRORS as e:
+        print(f"⚠️ Archive segment {name} is damaged ({e}); using the rows before the damage")
+        if damaged is not None:
+            damaged.append(name)
+
+
+def _write_segment(name, rows):
+    path = os.path.join(ARCHIVE_DIR, name)
+    tmp_path = path + '.tmp'
+    with gzip.open(tmp_path, 'wb') as f:
+        for row in rows:
+            f.write(codec.dumps(row) + b'\n')
+    os.replace(tmp_path, path)
+
+
+def iter_archived_alerts(start=None, end=None, email=None, alert_type=None):
+    """Stream archived alerts, oldest segment first.
+
+    `start`/`end` are datetimes bounding the alert's last activity. The index
+    is used to skip whole segments that cannot match before any are opened.
+    """
+    index = load_index()
+    for name in sorted(index["segments"]):
+        entry = index["segments"][name]
+        if start and entry["last_date"] and parse_alert_date(entry["last_date"]) < start:
+            continue
+        if end and entry["first_date"] and parse_alert_date(entry["first_date"]) > end:
+            continue
+        if email and email not in entry["emails"]:
+            continue
+        if alert_type and alert_type not in entry["types"]:
+            continue
+        if not os.path.exists(os.path.join(ARCHIVE_DIR, name)):
+            continue
+
+        for alert in _read_segment(name):
+            if email and alert.get('email') != email:
+                continue
+            if alert_type and alert.get('type') != alert_type:
+                continue
+            activity = last_activity(alert)
+            if start and (activity is None or activity < start):
+                continue
+            if end and (activity is None or activity > end):
+                continue
+            yield alert
@@ -0,0 +1,66 @@
+import json
+import random
+import time
+
+import codec
+
+# Benchmark for the JSON codec: encode/decode a synthetic store at several sizes
+# with every installed backend, against the old pretty-printed stdlib save_db.
+
+STORE_SIZES = (1000, 10000, 100000)
+
+
+def make_store(alert_count):
+    rng = random.Random(alert_count)
+    alerts = []
+    for i in range(alert_count):
+        alert_type = rng.choice(['traffic_drop', 'site_down'])
+        alerts.append({
+            'date': f"2025-08-{1 + i % 28:02d}T{i % 24:02d}:{i % 60:02d}:00.{i % 1000000:06d}",
+            'type': alert_type,
+            'value': str(rng.randint(50, 500)),
+            'status': rng.choice(['Normal', 'Alert Sent']),
+            'email': f"user{i % 50}@example.com",
+            'current_value': rng.randint(50, 500)
+        })
+    users = [{'email': f"user{i}@example.com", 'password': 'secret', 'notifications': True} for i in range(50)]
+    feedback = [{'type': 'alert', 'alertId': i, 'rating': rng.randint(1, 5), 'text': 'Useful alert',
+                 'date': '2025-08-04T12:00:00'} for i in range(alert_count // 100)]
+    return {'alerts': alerts, 'users': users, 'feedback': feedback}
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run(sizes=STORE_SIZES):
+    backends = [name for name, module in (('orjson', codec.orjson), ('msgspec', codec.msgspec)) if module]
+    backends.append('json')
+    print(f"🧪 JSON codec benchmark (active backend: {codec.BACKEND})")
+    print(f"{'alerts':>8}  {'backend':<16} {'size KB':>9} {'encode ms':>10} {'decode ms':>10}")
+
+    for size in sizes:
+        store = make_store(size)
+        repeat = 5 if size <= 10000 else 2
+
+        # What save_db/load_db did before the codec: indent=2 text via stdlib json
+        baseline = json.dumps(store, indent=2)
+        encode = best_of(lambda: json.dumps(store, indent=2), repeat)
+        decode = best_of(lambda: json.loads(baseline), repeat)
+        print(f"{size:>8}  {'json (indent=2)':<16} {len(baseline) / 1024:>9.0f} {encode * 1000:>10.1f} {decode * 1000:>10.1f}")
+
+        for backend in backends:
+            data = codec.dumps(store, backend=backend)
+            encode = best_of(lambda: codec.dumps(store, backend=backend), repeat)
+            decode = best_of(lambda: codec.loads(data, backend=backend), repeat)
+            assert codec.loads(data, backend=backend) == store
+            print(f"{size:>8}  {backend:<16} {len(data) / 1024:>9.0f} {encode * 1000:>10.1f} {decode * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,177 @@
+import json
+import os
+import tempfile
+from typing import Optional, Union
+
+from flask.json.provider import DefaultJSONProvider
+
+# JSON codec shared by the db.json store, the alert archive and API responses.
+# orjson or msgspec are used when installed (pick one with JSON_CODEC), with the
+# stdlib json module as the always-available fallback.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+if msgspec is not None:
+    # Typed records for what the app writes. The store keeps plain dicts, since
+    # rows carry free-form extra keys that decoding straight into a Struct would
+    # drop; to_record() checks new records against these on the way in.
+    class AlertRecord(msgspec.Struct):
+        id: str = msgspec.UNSET
+        date: str = msgspec.UNSET
+        type: str = msgspec.UNSET
+        value: Union[int, float, str] = msgspec.UNSET
+        status: str = msgspec.UNSET
+        email: str = msgspec.UNSET
+        phone: str = msgspec.UNSET
+        current_value: Union[int, float, str, None] = msgspec.UNSET
+        last_checked: str = msgspec.UNSET
+        webhook: str = msgspec.UNSET
+        webhook_secret: str = msgspec.UNSET
+        email_status: str = msgspec.UNSET
+        webhook_status: str = msgspec.UNSET
+        webhook_queued_at: str = msgspec.UNSET
+
+    class UserRecord(msgspec.Struct):
+        email: str = msgspec.UNSET
+        password: str = msgspec.UNSET
+        notifications: bool = msgspec.UNSET
+
+    class FeedbackRecord(msgspec.Struct):
+        type: Optional[str] = msgspec.UNSET
+        alertId: Union[str, int, None] = msgspec.UNSET
+        rating: Union[int, str, None] = msgspec.UNSET
+        text: Optional[str] = msgspec.UNSET
+        date: str = msgspec.UNSET
+
+    RECORD_TYPES = {'alert': AlertRecord, 'user': UserRecord, 'feedback': FeedbackRecord}
+    ValidationError = (msgspec.ValidationError,)
+else:
+    RECORD_TYPES = {}
+    ValidationError = ()
+
+
+def to_record(kind, data):
+    """Check an 'alert', 'user' or 'feedback' dict against its Struct.
+
+    Known fields come back as the Struct normalised them and every other key
+    is kept as given. Raises one of ValidationError on a mistyped field.
+    Without msgspec this is a plain copy.
+    """
+    record = dict(data)
+    record_type = RECORD_TYPES.get(kind)
+    if record_type is None:
+        return record
+    struct = msgspec.convert(data, record_type, strict=False)
+    for field in record_type.__struct_fields__:
+        value = getattr(struct, field)
+        if value is not msgspec.UNSET:
+            record[field] = value
+    return record
+
+
+def _pick_backend(preferred):
+    available = {'orjson': orjson is not None, 'msgspec': msgspec is not None, 'json': True}
+    if preferred:
+        if available.get(preferred):
+            return preferred
+        print(f"⚠️ JSON_CODEC={preferred} is not installed, falling back")
+    for name in ('orjson', 'msgspec', 'json'):
+        if available[name]:
+            return name
+
+
+BACKEND = _pick_backend(os.environ.get('JSON_CODEC', '').strip().lower())
+
+# Every exception the active backend raises for malformed input
+DecodeError = (json.JSONDecodeError,)
+if orjson is not None:
+    DecodeError += (orjson.JSONDecodeError,)
+if msgspec is not None:
+    DecodeError += (msgspec.DecodeError,)
+
+if msgspec is not None:
+    _msgspec_encoder = msgspec.json.Encoder()
+    _msgspec_sorted_encoder = msgspec.json.Encoder(order='sorted')
+    _msgspec_decoder = msgspec.json.Decoder()
+
+
+def dumps(obj, pretty=False, sort_keys=False, backend=None):
+    """Encode `obj` to UTF-8 JSON bytes, compact unless `pretty` is set"""
+    backend = backend or BACKEND
+    if backend == 'orjson':
+        option = orjson.OPT_NON_STR_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, option=option)
+    if backend == 'msgspec':
+        data = (_msgspec_sorted_encoder if sort_keys else _msgspec_encoder).encode(obj)
+        return msgspec.json.format(data, indent=2) if pretty else data
+    if pretty:
+        return json.dumps(obj, indent=2, sort_keys=sort_keys, ensure_ascii=False).encode('utf-8')
+    return json.dumps(obj, separators=(',', ':'), sort_keys=sort_keys, ensure_ascii=False).encode('utf-8')
+
+
+def loads(data, backend=None):
+    """Decode JSON from bytes or str"""
+    backend = backend or BACKEND
+    if backend == 'orjson':
+        return orjson.loads(data)
+    if backend == 'msgspec':
+        return _msgspec_decoder.decode(data)
+    return json.loads(data)
+
+
+def load_file(path):
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+
+def dump_file(obj, path, pretty=False):
+    """Write atomically: readers see the old file or the new one, never a partial write"""
+    data = dumps(obj, pretty=pretty)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class CodecJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes request/response bodies with the codec.
+
+    Values the fast backends cannot encode (e.g. Decimal) fall back to Flask's
+    default provider, so behaviour matches jsonify for everything else.
+    """
+
+    def dumps(self, obj, **kwargs):
+        return self._encode(obj, pretty='indent' in kwargs).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def _encode(self, obj, pretty=False):
+        try:
+            return dumps(obj, pretty=pretty, sort_keys=self.sort_keys)
+        except TypeError:
+            kwargs = {'indent': 2} if pretty else {'separators': (',', ':')}
+            return super().dumps(obj, **kwargs).encode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self._encode(obj, pretty=pretty) + b'\n', mimetype=self.mimetype)
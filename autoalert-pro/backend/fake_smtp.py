@@ -0,0 +1,160 @@
+import socketserver
+import threading
+import time
+
+from rate_limit import TokenBucket
+
+# Minimal local SMTP server for exercising the sender pool without Gmail.
+# It accepts any login, keeps delivered messages in memory and can inject the
+# same throttling replies providers use: 421 on MAIL FROM when a sender goes
+# over its allowance and 450 on RCPT TO when one recipient gets too much mail.
+
+
+class FakeSMTPHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write((line + '\r\n').encode('utf-8'))
+
+    def handle(self):
+        server = self.server
+        self.reply('220 localhost fake SMTP ready')
+        sender, recipients = None, []
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            line = raw.decode('utf-8', 'replace').rstrip('\r\n')
+            command = line[:4].upper()
+
+            if command in ('EHLO', 'HELO'):
+                self.reply('250-localhost')
+                self.reply('250 AUTH PLAIN LOGIN')
+            elif command == 'AUTH':
+                self.reply('235 2.7.0 Authentication successful')
+            elif command == 'MAIL':
+                sender = line.split(':', 1)[1].strip().strip('<>').split(' ')[0]
+                if not server.sender_bucket(sender).try_acquire():
+                    server.throttled.append(('sender', sender))
+                    self.reply('421 4.7.0 Try again later, closing connection')
+                    return
+                recipients = []
+                self.reply('250 OK')
+            elif command == 'RCPT':
+                recipient = line.split(':', 1)[1].strip().strip('<>').split(' ')[0]
+                if not server.recipient_bucket(recipient).try_acquire():
+                    server.throttled.append(('recipient', recipient))
+                    self.reply('450 4.2.1 The user you are trying to contact is receiving mail too quickly')
+                    continue
+                recipients.append(recipient)
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line in (b'.\r\n', b'.\n'):
+                        break
+                    lines.append(data_line)
+                server.record(sender, recipients, b''.join(lines))
+                self.reply('250 OK queued')
+            elif command == 'RSET':
+                sender, recipients = None, []
+                self.reply('250 OK')
+            elif command == 'NOOP':
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class FakeSMTPServer(socketserver.ThreadingTCPServer):
+    """Threaded fake SMTP server with per-sender and per-recipient throttling.
+
+    `sender_rate`/`recipient_rate` are messages per second (None disables that
+    limit), with bursts of `sender_burst`/`recipient_burst`.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0, sender_rate=None, sender_burst=1,
+                 recipient_rate=None, recipient_burst=1):
+        super().__init__((host, port), FakeSMTPHandler)
+        self.sender_rate = sender_rate
+        self.sender_burst = sender_burst
+        self.recipient_rate = recipient_rate
+        self.recipient_burst = recipient_burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.messages = []
+        self.throttled = []
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def _bucket(self, key, rate, burst):
+        if rate is None:
+            return TokenBucket(1, 1)
+        with self.lock:
+            if key not in self.buckets:
+                self.buckets[key] = TokenBucket(rate, burst)
+            return self.buckets[key]
+
+    def sender_bucket(self, sender):
+        return self._bucket(('sender', sender), self.sender_rate, self.sender_burst)
+
+    def recipient_bucket(self, recipient):
+        return self._bucket(('recipient', recipient), self.recipient_rate, self.recipient_burst)
+
+    def record(self, sender, recipients, data):
+        with self.lock:
+            self.messages.append({'sender': sender, 'recipients': list(recipients), 'data': data})
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+
+def run_throttling_check(messages=40, sender_rate=2.0, accounts=3):
+    """Push `messages` alerts through the sender pool against a throttling fake server"""
+    from app import app
+    from flask_mail import Message
+    from mailer import SenderAccount, SenderPool
+
+    server = FakeSMTPServer(sender_rate=sender_rate, sender_burst=2).start()
+    print(f"🧪 Fake SMTP server on 127.0.0.1:{server.port} "
+          f"(each sender limited to {sender_rate}/s)")
+
+    pool = SenderPool(
+        [SenderAccount(f'sender{i}@example.com', 'secret', server='127.0.0.1', port=server.port,
+                       use_tls=False, rate_per_minute=sender_rate * 60 * 2, burst=4)
+         for i in range(accounts)],
+        recipient_rate_per_minute=6000,
+        recipient_burst=100,
+        max_wait=30
+    )
+
+    delivered = 0
+    started = time.monotonic()
+    with app.app_context():
+        for i in range(messages):
+            msg = Message(subject=f'Throttle check {i}', recipients=[f'ops{i % 5}@example.com'], body='test')
+            if pool.send(msg):
+                delivered += 1
+    elapsed = time.monotonic() - started
+    pool.close()
+    server.shutdown()
+
+    print(f"✅ Delivered {delivered}/{messages} in {elapsed:.1f}s "
+          f"({delivered / elapsed:.1f} msg/s), server throttled {len(server.throttled)} attempts")
+    for account in pool.stats():
+        print(f"   {account}")
+    return delivered == messages
+
+
+if __name__ == "__main__":
+    run_throttling_check()
@@ -0,0 +1,105 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from webhook import SIGNATURE_HEADER, TIMESTAMP_HEADER, verify_signature
+
+# Local stand-in for a webhook consumer. It speaks HTTP/1.1 keep-alive, checks
+# the HMAC signature on every batch, records what it received and can answer
+# the first few requests with 503 to exercise the dispatcher's retries.
+
+
+class FakeWebhookHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def respond(self, status):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        with server.lock:
+            server.requests += 1
+            server.connections.add(self.client_address)
+            if server.fail_next > 0:
+                server.fail_next -= 1
+                self.respond(503)
+                return
+
+        if server.secret and not verify_signature(server.secret, self.headers.get(TIMESTAMP_HEADER),
+                                                  body, self.headers.get(SIGNATURE_HEADER)):
+            with server.lock:
+                server.bad_signatures += 1
+            self.respond(401)
+            return
+
+        payload = json.loads(body)
+        with server.lock:
+            server.batches.append(payload['events'])
+        self.respond(204)
+
+
+class FakeWebhookReceiver(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, secret='', fail_next=0):
+        super().__init__((host, port), FakeWebhookHandler)
+        self.secret = secret
+        self.fail_next = fail_next
+        self.lock = threading.Lock()
+        self.batches = []
+        self.connections = set()
+        self.requests = 0
+        self.bad_signatures = 0
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/hooks/alerts"
+
+    @property
+    def events(self):
+        with self.lock:
+            return [event for batch in self.batches for event in batch]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def run_webhook_check(events=2000, fail_next=2):
+    """Deliver a burst of alert events to the fake receiver and report throughput"""
+    from webhook import WebhookDispatcher
+
+    secret = 'local-test-secret'
+    receiver = FakeWebhookReceiver(secret=secret, fail_next=fail_next).start()
+    # The receiver is on loopback, which the SSRF guard only allows when listed
+    dispatcher = WebhookDispatcher(batch_window=0.05, secret=secret, allowed_hosts={'127.0.0.1'})
+    print(f"🧪 Fake webhook receiver at {receiver.url} (first {fail_next} requests get 503)")
+
+    started = time.monotonic()
+    for i in range(events):
+        dispatcher.enqueue(receiver.url, {'id': i, 'type': 'site_down', 'current_value': 300 + i % 50})
+    dispatcher.flush(timeout=30)
+    elapsed = time.monotonic() - started
+    dispatcher.close()
+    receiver.shutdown()
+
+    received = receiver.events
+    ok = len(received) == events and len({e['id'] for e in received}) == events
+    print(f"{'✅' if ok else '❌'} {len(received)}/{events} events in {elapsed:.2f}s "
+          f"({len(received) / elapsed:.0f} events/s)")
+    print(f"   {len(receiver.batches)} batches over {receiver.requests} requests, "
+          f"{len(receiver.connections)} TCP connections, {receiver.bad_signatures} bad signatures")
+    print(f"   dispatcher stats: {dispatcher.stats}")
+    return ok
+
+
+if __name__ == "__main__":
+    run_webhook_check()
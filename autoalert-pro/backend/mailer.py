@@ -0,0 +1,248 @@
+import os
+import smtplib
+import threading
+import time
+
+from flask import current_app
+from flask_mail import BadHeaderError, email_dispatched, sanitize_address, sanitize_addresses
+
+from rate_limit import AdaptiveTokenBucket, KeyedLimiter
+
+# SMTP reply codes providers use to say "slow down" rather than "no"
+THROTTLE_CODES = {421, 450, 451, 452, 454}
+
+# Default limits, per minute. Gmail allows short bursts but throttles sustained
+# sending from a single account well below what the sweep loop can produce.
+ACCOUNT_RATE_PER_MINUTE = float(os.environ.get('SMTP_ACCOUNT_RATE_PER_MINUTE', '20'))
+ACCOUNT_BURST = float(os.environ.get('SMTP_ACCOUNT_BURST', '5'))
+RECIPIENT_RATE_PER_MINUTE = float(os.environ.get('SMTP_RECIPIENT_RATE_PER_MINUTE', '6'))
+RECIPIENT_BURST = float(os.environ.get('SMTP_RECIPIENT_BURST', '3'))
+# Longest a single send may wait for a token. Sends happen inside /check-alerts
+# and /set-alert, so by default a rate-limited send gives up at once; the alert
+# stays active and the next sweep retries it.
+MAX_SEND_WAIT = float(os.environ.get('SMTP_MAX_SEND_WAIT', '0'))
+
+
+class SenderAccount:
+    """One SMTP login, its adaptive rate limiter and a reusable connection"""
+
+    def __init__(self, username, password, server='smtp.gmail.com', port=587, use_tls=True,
+                 rate_per_minute=ACCOUNT_RATE_PER_MINUTE, burst=ACCOUNT_BURST, timeout=30, sender=None):
+        self.username = username
+        self.password = password
+        # From address for mail sent through this login (defaults to the login itself)
+        self.sender = sender or username
+        self.server = server
+        self.port = port
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.limiter = AdaptiveTokenBucket(rate_per_minute / 60.0, burst)
+        self.connection = None
+        self.lock = threading.Lock()
+        self.sent = 0
+        self.throttled = 0
+
+    def _connect(self):
+        host = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                host.starttls()
+            if self.username and self.password:
+                host.login(self.username, self.password)
+        except Exception:
+            host.close()
+            raise
+        return host
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.quit()
+            except Exception:
+                pass
+            self.connection = None
+
+    def sendmail(self, sender, recipients, payload):
+        """Send over the kept-alive connection, reconnecting once if it dropped"""
+        with self.lock:
+            for attempt in range(2):
+                if self.connection is None:
+                    self.connection = self._connect()
+                try:
+                    return self.connection.sendmail(sender, recipients, payload)
+                except smtplib.SMTPServerDisconnected:
+                    self.connection = None
+                    if attempt:
+                        raise
+                except smtplib.SMTPResponseException as e:
+                    # 421 means the server is closing the channel as well
+                    if e.smtp_code == 421:
+                        self.connection = None
+                    raise
+
+
+class SenderPool:
+    """Spreads outgoing mail across sender accounts under per-account and
+    per-recipient rate limits, backing off when the provider pushes back."""
+
+    def __init__(self, accounts, recipient_rate_per_minute=RECIPIENT_RATE_PER_MINUTE,
+                 recipient_burst=RECIPIENT_BURST, max_wait=MAX_SEND_WAIT):
+        if not accounts:
+            raise ValueError("SenderPool needs at least one sender account")
+        self.accounts = list(accounts)
+        self.recipients = KeyedLimiter(recipient_rate_per_minute / 60.0, recipient_burst)
+        self.max_wait = max_wait
+
+    def _pick_account(self, skip):
+        candidates = [a for a in self.accounts if a not in skip]
+        if not candidates:
+            return None, float('inf')
+        # Prefer whichever account gets a token soonest, then the fastest one
+        candidates.sort(key=lambda a: (a.limiter.wait_time(), -a.limiter.rate))
+        account = candidates[0]
+        return account, account.limiter.wait_time()
+
+    def _acquire_recipients(self, recipients, deadline):
+        taken = []
+        for recipient in recipients:
+            bucket = self.recipients.get(recipient)
+            if not bucket.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                print(f"⏳ Recipient rate limit reached for {recipient}, will retry on the next sweep")
+                self._release_recipients(taken)
+                return False
+            taken.append(recipient)
+        return True
+
+    def _release_recipients(self, recipients):
+        # Hand tokens back for mail that never went out
+        for recipient in recipients:
+            self.recipients.get(recipient).release()
+
+    def send(self, message):
+        """Send a Flask-Mail Message. Returns True once one account accepts it.
+
+        Applies the same checks as Flask-Mail's Connection.send: header
+        injection raises BadHeaderError, and with MAIL_SUPPRESS_SEND (on by
+        default when testing) nothing is sent but email_dispatched still fires.
+        """
+        assert message.send_to, "No recipients have been added"
+        if message.has_bad_headers():
+            raise BadHeaderError
+
+        app = current_app._get_current_object()
+        if message.date is None:
+            message.date = time.time()
+        if app.extensions['mail'].suppress or app.config.get('MAIL_SUPPRESS_SEND', app.testing):
+            email_dispatched.send(message, app=app)
+            return True
+
+        recipients = list(sanitize_addresses(message.send_to))
+        deadline = time.monotonic() + self.max_wait
+        if not self._acquire_recipients(recipients, deadline):
+            return False
+
+        tried = set()
+        while True:
+            account, wait = self._pick_account(tried)
+            if account is None:
+                print("❌ All sender accounts are throttled or failing, will retry on the next sweep")
+                self._release_recipients(recipients)
+                return False
+            if not account.limiter.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                print(f"⏳ Sender rate limit reached for {account.username} (next token in {wait:.1f}s)")
+                tried.add(account)
+                continue
+
+            message.sender = account.sender
+            try:
+                refused = account.sendmail(sanitize_address(account.sender), recipients, message.as_bytes())
+            except smtplib.SMTPRecipientsRefused as e:
+                self._record_refusals(e.recipients)
+                print(f"❌ All recipients refused: {e.recipients}")
+                return False
+            except smtplib.SMTPResponseException as e:
+                if e.smtp_code in THROTTLE_CODES:
+                    account.limiter.on_throttle()
+                    account.throttled += 1
+                    # Not added to `tried`: the emptied bucket pushes this account behind
+                    # the others, and with a send wait it can be retried before the deadline
+                    print(f"⏳ {account.username} throttled ({e.smtp_code}), slowing to "
+                          f"{account.limiter.rate * 60:.1f}/min")
+                    continue
+                # Bad login (535), refused sender or another 5xx: this account is
+                # unusable for now, but the others may still get the message out
+                account.close()
+                print(f"❌ SMTP error from {account.username}: {e.smtp_code} {e.smtp_error!r}")
+                tried.add(account)
+                continue
+            except (smtplib.SMTPException, OSError) as e:
+                account.close()
+                print(f"❌ Connection problem with {account.username}: {e}")
+                tried.add(account)
+                continue
+
+            account.limiter.on_success()
+            account.sent += 1
+            self._record_refusals(refused)
+            self._record_accepted(recipients, refused)
+            email_dispatched.send(message, app=app)
+            return True
+
+    def _record_refusals(self, refused):
+        for recipient, (code, _) in (refused or {}).items():
+            if code in THROTTLE_CODES:
+                self.recipients.get(recipient).on_throttle()
+
+    def _record_accepted(self, recipients, refused):
+        # Lets a recipient's rate climb back after an earlier throttle
+        for recipient in recipients:
+            if recipient not in (refused or {}):
+                self.recipients.get(recipient).on_success()
+
+    def stats(self):
+        return [{
+            'username': a.username,
+            'rate_per_minute': round(a.limiter.rate * 60, 2),
+            'sent': a.sent,
+            'throttled': a.throttled
+        } for a in self.accounts]
+
+    def close(self):
+        for account in self.accounts:
+            account.close()
+
+
+def parse_accounts(value):
+    """Parse 'user:password,user2:password2' into (username, password) pairs"""
+    accounts = []
+    for item in (value or '').split(','):
+        item = item.strip()
+        if not item or ':' not in item:
+            continue
+        username, password = item.split(':', 1)
+        accounts.append((username.strip(), password.strip()))
+    return accounts
+
+
+def build_sender_pool(config):
+    """Create the pool from the app's MAIL_* config plus any extra EMAIL_ACCOUNTS.
+
+    The primary account sends as MAIL_DEFAULT_SENDER; extra accounts send as themselves.
+    """
+    credentials = [(config['MAIL_USERNAME'], config['MAIL_PASSWORD'])]
+    for username, password in parse_accounts(os.environ.get('EMAIL_ACCOUNTS')):
+        if username not in [c[0] for c in credentials]:
+            credentials.append((username, password))
+
+    accounts = [
+        SenderAccount(
+            username,
+            password,
+            server=config['MAIL_SERVER'],
+            port=config['MAIL_PORT'],
+            use_tls=config.get('MAIL_USE_TLS', True),
+            sender=config.get('MAIL_DEFAULT_SENDER') if index == 0 else None
+        )
+        for index, (username, password) in enumerate(credentials)
+    ]
+    return SenderPool(accounts)
@@ -0,0 +1,243 @@
+import cProfile
+import functools
+import os
+import random
+import signal
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+from datetime import datetime
+
+from flask import g, request
+
+# Opt-in profiling for the request and sweep hot paths. While disabled, span()
+# hands back a shared no-op context and timed() functions pay one attribute
+# check, so this can stay wired in permanently. Switch it on at runtime through
+# /admin/profiling or SIGUSR1 (toggle) / SIGUSR2 (dump spans).
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(os.path.dirname(__file__), 'profiles'))
+# Dumps kept in PROFILE_DIR; the oldest are deleted as new ones are written
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', '50'))
+PROFILE_EXTENSIONS = ('.pstats', '.folded')
+
+
+class ProfilingState:
+
+    def __init__(self):
+        self.enabled = os.environ.get('PROFILING_ENABLED', '').lower() in ('1', 'true', 'yes')
+        # Fraction of requests (0.0-1.0) run under cProfile while enabled
+        self.sample_rate = float(os.environ.get('PROFILING_SAMPLE_RATE', '0'))
+        # Profile the next /check-alerts sweep regardless of sample_rate
+        self.sweep_pending = False
+        self.lock = threading.Lock()
+        # name -> [count, total seconds, max seconds]
+        self.spans = {}
+        # 'outer;inner' span stacks -> self time in microseconds (flamegraph folded format)
+        self.folded = Counter()
+        self.dumps = []
+
+
+state = ProfilingState()
+_local = threading.local()
+_NULL_SPAN = nullcontext()
+# cProfile can only run one profiler per process at a time
+_profiler_lock = threading.Lock()
+
+
+class _Span:
+    __slots__ = ('name', 'started', 'child_time')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        stack.append(self)
+        self.child_time = 0.0
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        stack = _local.stack
+        path = ';'.join(s.name for s in stack)
+        stack.pop()
+        if stack:
+            stack[-1].child_time += elapsed
+        with state.lock:
+            stats = state.spans.get(self.name)
+            if stats is None:
+                stats = state.spans[self.name] = [0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] = max(stats[2], elapsed)
+            state.folded[path] += int(max(0.0, elapsed - self.child_time) * 1e6)
+        return False
+
+
+def span(name):
+    """Context manager timing a block under `name` while profiling is enabled"""
+    if not state.enabled:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def timed(name):
+    """Decorator form of span()"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not state.enabled:
+                return fn(*args, **kwargs)
+            with _Span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def configure(enabled=None, sample_rate=None, sweep=None):
+    if sample_rate is not None:
+        state.sample_rate = min(1.0, max(0.0, float(sample_rate)))
+    if sweep:
+        with state.lock:
+            state.sweep_pending = True
+        # Profiling the next sweep implies spans are wanted for it too
+        if enabled is None:
+            enabled = True
+    if enabled is not None:
+        state.enabled = bool(enabled)
+    print(f"🔬 Profiling {'enabled' if state.enabled else 'disabled'} "
+          f"(sample rate {state.sample_rate:.0%}, next sweep {'yes' if state.sweep_pending else 'no'})")
+    return status()
+
+
+def status():
+    with state.lock:
+        spans = {
+            name: {'count': count, 'total_ms': round(total * 1000, 3),
+                   'avg_ms': round(total * 1000 / count, 3), 'max_ms': round(peak * 1000, 3)}
+            for name, (count, total, peak) in state.spans.items()
+        }
+        dumps = list(state.dumps[-20:])
+        sweep_pending = state.sweep_pending
+    return {
+        'enabled': state.enabled,
+        'sample_rate': state.sample_rate,
+        'sweep_pending': sweep_pending,
+        'profile_dir': PROFILE_DIR,
+        'spans': spans,
+        'recent_dumps': dumps
+    }
+
+
+def _dump_path(label, extension):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    safe_label = ''.join(c if c.isalnum() or c in '-_' else '_' for c in label)
+    return os.path.join(PROFILE_DIR, f"{stamp}-{safe_label}.{extension}")
+
+
+def _record_dump(path):
+    """Remember a new dump and delete the oldest ones past PROFILE_MAX_FILES"""
+    with state.lock:
+        state.dumps.append(path)
+        del state.dumps[:-PROFILE_MAX_FILES]
+    try:
+        # Names start with a timestamp, so sorting them orders dumps by age
+        names = sorted(name for name in os.listdir(PROFILE_DIR) if name.endswith(PROFILE_EXTENSIONS))
+        for name in names[:-PROFILE_MAX_FILES]:
+            os.remove(os.path.join(PROFILE_DIR, name))
+    except OSError as e:
+        print(f"⚠️ Could not prune {PROFILE_DIR}: {e}")
+
+
+def dump_spans(reset=True):
+    """Write collected span stacks as a folded file (flamegraph.pl / speedscope)"""
+    with state.lock:
+        folded = dict(state.folded)
+        if reset:
+            state.folded.clear()
+            state.spans.clear()
+    if not folded:
+        return None
+    path = _dump_path('spans', 'folded')
+    with open(path, 'w') as f:
+        for stack, micros in sorted(folded.items()):
+            f.write(f"{stack} {micros}\n")
+    _record_dump(path)
+    print(f"🔬 Span profile written to {path}")
+    return path
+
+
+def _should_profile_request():
+    if request.endpoint == 'check_alerts':
+        # Test-and-clear under the lock so only one concurrent sweep claims it
+        with state.lock:
+            claimed = state.sweep_pending
+            state.sweep_pending = False
+        if claimed:
+            return True
+    return state.sample_rate > 0 and random.random() < state.sample_rate
+
+
+def _before_request():
+    if not state.enabled and not state.sweep_pending:
+        return
+    if not _should_profile_request():
+        return
+    if not _profiler_lock.acquire(blocking=False):
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler (e.g. a debugger) already owns the hook
+        _profiler_lock.release()
+        return
+    g.profiler = profiler
+    g.profile_span = _Span(f"request:{request.endpoint}")
+    g.profile_span.__enter__()
+
+
+def _teardown_request(exc):
+    profiler = g.pop('profiler', None)
+    if profiler is None:
+        return
+    try:
+        profiler.disable()
+        g.pop('profile_span').__exit__(None, None, None)
+        path = _dump_path(request.endpoint or 'request', 'pstats')
+        profiler.dump_stats(path)
+        _record_dump(path)
+        print(f"🔬 Request profile written to {path}")
+    except Exception as e:
+        print(f"❌ Error writing profile: {e}")
+    finally:
+        _profiler_lock.release()
+
+
+def _handle_toggle(signum, frame):
+    # Only flip the flag here: printing or taking state.lock from a signal handler
+    # can deadlock (or raise a reentrant-call error) on the interrupted thread
+    state.enabled = not state.enabled
+    threading.Thread(target=_log_toggle, args=(state.enabled,), daemon=True).start()
+
+
+def _log_toggle(enabled):
+    print(f"🔬 Profiling {'enabled' if enabled else 'disabled'} by signal")
+
+
+def _handle_dump(signum, frame):
+    # Do the file work off the signal handler
+    threading.Thread(target=dump_spans, daemon=True).start()
+
+
+def init_app(app):
+    """Register the request hooks and, where available, SIGUSR1/SIGUSR2 handlers"""
+    app.before_request(_before_request)
+    app.teardown_request(_teardown_request)
+    if hasattr(signal, 'SIGUSR1') and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR1, _handle_toggle)
+        signal.signal(signal.SIGUSR2, _handle_dump)
@@ -0,0 +1,115 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `capacity`"""
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.clock = clock
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        elapsed = max(0.0, now - self.updated)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated = now
+        return now
+
+    def try_acquire(self, tokens=1):
+        """Take `tokens` if they are available right now; never blocks"""
+        with self.lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+    def release(self, tokens=1):
+        """Return tokens that were taken but not used"""
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + tokens)
+
+    def wait_time(self, tokens=1):
+        """Seconds until `tokens` would be available (0 if they already are)"""
+        with self.lock:
+            self._refill()
+            if self.tokens >= tokens:
+                return 0.0
+            if self.rate <= 0:
+                return float('inf')
+            return (tokens - self.tokens) / self.rate
+
+    def acquire(self, tokens=1, timeout=None):
+        """Block until `tokens` are taken; False if `timeout` seconds pass first"""
+        deadline = None if timeout is None else self.clock() + timeout
+        while True:
+            if self.try_acquire(tokens):
+                return True
+            wait = self.wait_time(tokens)
+            if deadline is not None:
+                remaining = deadline - self.clock()
+                if remaining <= 0 or wait > remaining:
+                    return False
+            time.sleep(min(wait, 1.0) if wait > 0 else 0.001)
+
+
+class AdaptiveTokenBucket(TokenBucket):
+    """Token bucket that tunes its own rate from provider feedback (AIMD).
+
+    Every accepted send nudges the rate up by `increase` tokens/sec until
+    `max_rate`; every throttling response (421/450-style) halves it, never
+    below `min_rate`, and empties the bucket so the backoff takes effect now.
+    """
+
+    def __init__(self, rate, capacity, min_rate=None, max_rate=None, increase=None,
+                 decrease_factor=0.5, clock=time.monotonic):
+        super().__init__(rate, capacity, clock=clock)
+        self.min_rate = float(min_rate if min_rate is not None else rate / 10)
+        self.max_rate = float(max_rate if max_rate is not None else rate)
+        self.increase = float(increase if increase is not None else self.max_rate / 20)
+        self.decrease_factor = decrease_factor
+        self.throttle_count = 0
+
+    def on_success(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self):
+        with self.lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            self.tokens = 0.0
+            self.throttle_count += 1
+
+
+class KeyedLimiter:
+    """One adaptive bucket per key (e.g. per recipient), created on first use"""
+
+    def __init__(self, rate, capacity, max_keys=10000, clock=time.monotonic, **kwargs):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self.clock = clock
+        self.kwargs = kwargs
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                if len(self.buckets) >= self.max_keys:
+                    self._evict_full()
+                bucket = AdaptiveTokenBucket(self.rate, self.capacity, clock=self.clock, **self.kwargs)
+                self.buckets[key] = bucket
+            return bucket
+
+    def _evict_full(self):
+        # Buckets that have refilled completely carry no state worth keeping
+        for key in [k for k, b in self.buckets.items() if b.wait_time(b.capacity) == 0]:
+            del self.buckets[key]
@@ -0,0 +1,440 @@
+import argparse
+import contextlib
+import csv
+import math
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import codec
+from archive import parse_alert_date
+from webhook import WEBHOOK_BATCH_WINDOW, WEBHOOK_MAX_BATCH
+
+# Replay harness: drives a recorded or synthetic metric trace through the real
+# alert evaluation and notification code (is_alert_triggered, dispatch_alert,
+# send_alert_email, notify_webhook) on a virtual clock, with the SMTP pool and
+# webhook dispatcher swapped for capturing fakes. Useful for checking both
+# which notifications an incident produces and how long, in virtual time, each
+# channel takes to notify after the incident starts.
+#
+# Trace rows carry a timestamp, the metric/alert type and the observed value:
+#   CSV:    timestamp,type,value
+#   NDJSON: {"timestamp": "2025-08-04T12:00:00", "type": "site_down", "value": 420}
+# Timestamps are ISO dates or seconds relative to the start of the trace.
+
+
+class VirtualClock:
+    """Clock that only moves when the replay advances it"""
+
+    def __init__(self, start=None):
+        self.current = start or datetime(2025, 1, 1)
+
+    def now(self):
+        return self.current
+
+    def advance_to(self, moment):
+        if moment > self.current:
+            self.current = moment
+
+
+class CapturingMailer:
+    """Stands in for the SenderPool; records messages instead of sending them"""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.messages = []
+
+    def send(self, message):
+        self.messages.append({
+            'subject': message.subject,
+            'recipients': sorted(message.send_to),
+            'virtual_time': self.clock.now().isoformat()
+        })
+        return True
+
+
+class CapturingWebhooks:
+    """Stands in for the WebhookDispatcher, batching on the virtual clock.
+
+    Events for an endpoint are held for `batch_window` virtual seconds (or
+    until `max_batch` of them queue up), like the real dispatcher, then
+    recorded as delivered and confirmed through `on_result(events, delivered)`,
+    once per batch.
+    """
+
+    def __init__(self, clock, batch_window=WEBHOOK_BATCH_WINDOW, max_batch=WEBHOOK_MAX_BATCH, on_result=None):
+        self.clock = clock
+        self.on_result = on_result
+        self.batch_window = timedelta(seconds=batch_window)
+        self.max_batch = max_batch
+        self.pending = {}
+        self.events = []
+        self.batches = 0
+        # Virtual time of the batch whose callback is running
+        self.delivered_at = None
+
+    def enqueue(self, url, event, secret=None):
+        entry = self.pending.get(url)
+        if entry is None:
+            entry = self.pending[url] = {'since': self.clock.now(), 'full_at': None, 'items': []}
+        entry['items'].append(event)
+        if len(entry['items']) >= self.max_batch and entry['full_at'] is None:
+            entry['full_at'] = self.clock.now()
+
+    def deliver_due(self, force=False):
+        """Deliver every batch whose window has closed by now (all of them with `force`)"""
+        now = self.clock.now()
+        for url in list(self.pending):
+            entry = self.pending[url]
+            due = entry['full_at'] or entry['since'] + self.batch_window
+            if force or due <= now:
+                del self.pending[url]
+                self._deliver(url, entry['items'], due)
+
+    def _deliver(self, url, items, at):
+        self.batches += 1
+        self.delivered_at = at
+        for event in items:
+            self.events.append({'url': url, 'event': event, 'virtual_time': at.isoformat()})
+        if self.on_result is not None:
+            self.on_result(items, True)
+        self.delivered_at = None
+
+
+def _parse_timestamp(value, base):
+    try:
+        return base + timedelta(seconds=float(value))
+    except (TypeError, ValueError):
+        return parse_alert_date(value)
+
+
+def load_trace(path, base=None):
+    """Read a CSV or NDJSON trace into time-ordered (timestamp, type, value) tuples.
+
+    Returns (trace, skipped): rows with a missing or unparseable timestamp,
+    type or value are left out and counted rather than aborting the replay.
+    """
+    base = base or datetime(2025, 1, 1)
+    skipped = 0
+    if path.endswith('.csv'):
+        with open(path, newline='') as f:
+            rows = list(csv.DictReader(f))
+    else:
+        rows = []
+        with open(path, 'rb') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    rows.append(codec.loads(line))
+                except codec.DecodeError:
+                    skipped += 1
+
+    trace = []
+    for row in rows:
+        if not isinstance(row, dict):
+            skipped += 1
+            continue
+        moment = _parse_timestamp(row.get('timestamp'), base)
+        try:
+            value = int(float(row.get('value')))
+        except (TypeError, ValueError, OverflowError):
+            value = None
+        if moment is None or not row.get('type') or value is None:
+            skipped += 1
+            continue
+        trace.append((moment, row['type'], value))
+    trace.sort(key=lambda point: point[0])
+    return trace, skipped
+
+
+def synthetic_trace(hours=24, interval_seconds=60, incidents=3, seed=7, start=None):
+    """Generate traffic and response-time series with a few incidents in them.
+
+    Traffic ('traffic_drop') follows a daily curve around ~120 visitors and
+    dips to ~30 during an incident; response time ('site_down') sits near
+    150ms and spikes to ~600ms.
+    """
+    rng = random.Random(seed)
+    start = start or datetime(2025, 8, 4)
+    steps = int(hours * 3600 / interval_seconds)
+    windows = []
+    for _ in range(incidents):
+        begin = rng.randrange(0, max(1, steps - 30))
+        windows.append((begin, begin + rng.randint(5, 30)))
+
+    trace = []
+    for step in range(steps):
+        moment = start + timedelta(seconds=step * interval_seconds)
+        in_incident = any(begin <= step < end for begin, end in windows)
+        daily = math.sin(2 * math.pi * (step * interval_seconds) / 86400)
+        traffic = 120 + 30 * daily + rng.gauss(0, 8)
+        response = 150 + rng.gauss(0, 20)
+        if in_incident:
+            traffic *= 0.25
+            response *= 4
+        trace.append((moment, 'traffic_drop', max(0, int(traffic))))
+        trace.append((moment, 'site_down', max(1, int(response))))
+    return trace
+
+
+def load_alerts(path=None):
+    """Alert set to replay against: a JSON list, a db.json-shaped file, or the live store"""
+    if path is None:
+        import app as app_module
+        data = app_module.load_db()
+    else:
+        data = codec.load_file(path)
+    alerts = data.get('alerts', []) if isinstance(data, dict) else data
+    # Replay works on copies so the store is never touched; ids let webhook
+    # results find their alert
+    copies = [dict(alert) for alert in alerts]
+    for alert in copies:
+        if not alert.get('id'):
+            alert['id'] = uuid.uuid4().hex
+    return copies
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def _summary(values):
+    return {
+        'count': len(values),
+        'p50': round(_percentile(values, 0.5), 3),
+        'p95': round(_percentile(values, 0.95), 3),
+        'max': round(max(values), 3) if values else 0.0
+    }
+
+
+def replay(trace, alerts, speed=None, rearm=False, sweep_interval=None, verbose=False):
+    """Run `trace` through the alert pipeline and return a report dict.
+
+    `speed` is the virtual-to-wall time ratio (e.g. 3600 replays an hour per
+    second); None replays as fast as possible. With `sweep_interval` (virtual
+    seconds) alerts are only evaluated on that schedule, against the latest
+    value of each metric, the way a periodic /check-alerts runs; otherwise
+    every trace point is evaluated as it arrives. With `rearm`, an alert that
+    has fired goes back to 'Normal' once its metric recovers, so repeated
+    incidents notify again. Without it, alerts behave like /check-alerts and
+    fire at most once.
+
+    Notification latency is measured in virtual seconds, per channel, from
+    the first trace point that crossed the alert's threshold to the email
+    being sent or the webhook batch being delivered.
+    """
+    import app as app_module
+
+    clock = VirtualClock(trace[0][0] if trace else None)
+    mailer = CapturingMailer(clock)
+    webhooks = CapturingWebhooks(clock)
+
+    # Index alerts by type once so each trace point only visits its own alerts
+    by_type = {}
+    skipped = 0
+    for alert in alerts:
+        try:
+            alert['_threshold'] = int(alert.get('value', 0))
+        except (TypeError, ValueError):
+            skipped += 1
+            continue
+        by_type.setdefault(alert.get('type'), []).append(alert)
+    by_id = {alert['id']: alert for group in by_type.values() for alert in group if alert.get('id')}
+
+    evaluations = triggers = 0
+    latencies = {'email': [], 'webhook': []}
+    dispatch_ms = []
+
+    # Webhook results land on the in-memory copies instead of db.json
+    def record_webhook_results(events, delivered):
+        for event in events:
+            alert = by_id.get(event.get('alert_id'))
+            if alert is None:
+                continue
+            app_module.update_alert_delivery(alert, 'webhook', delivered)
+            onset = alert.pop('_webhook_onset', None)
+            if delivered and onset is not None:
+                latencies['webhook'].append((webhooks.delivered_at - onset).total_seconds())
+
+    webhooks.on_result = record_webhook_results
+
+    def track_onset(metric, value, moment):
+        # The incident starts at the first point past the threshold and ends when it recovers
+        for alert in by_type.get(metric, ()):
+            if app_module.is_alert_triggered(metric, alert['_threshold'], value):
+                alert.setdefault('_onset', moment)
+            else:
+                alert.pop('_onset', None)
+
+    def evaluate(metric, value):
+        nonlocal evaluations, triggers
+        for alert in by_type.get(metric, ()):
+            if alert.get('status') == 'Alert Sent':
+                if rearm and not app_module.is_alert_triggered(metric, alert['_threshold'], value):
+                    app_module.reset_alert_delivery(alert)
+                continue
+            evaluations += 1
+            if not app_module.is_alert_triggered(metric, alert['_threshold'], value):
+                continue
+            triggers += 1
+            onset = alert.get('_onset', clock.now())
+            mails_before = len(mailer.messages)
+            started = time.perf_counter()
+            email_sent, webhook_queued = app_module.dispatch_alert(alert, alert['_threshold'], value)
+            dispatch_ms.append((time.perf_counter() - started) * 1000)
+            if email_sent and len(mailer.messages) > mails_before:
+                latencies['email'].append((clock.now() - onset).total_seconds())
+            if webhook_queued:
+                alert['_webhook_onset'] = onset
+
+    def sweep(moment, latest):
+        clock.advance_to(moment)
+        webhooks.deliver_due()
+        for metric, value in latest.items():
+            evaluate(metric, value)
+
+    saved = (app_module.current_time, app_module.sender_pool, app_module.webhook_dispatcher,
+             app_module.app.config['MAIL_USERNAME'], app_module.app.config['MAIL_PASSWORD'])
+    app_module.current_time = clock.now
+    app_module.sender_pool = mailer
+    app_module.webhook_dispatcher = webhooks
+    # send_alert_email refuses to run with the placeholder credentials
+    app_module.app.config['MAIL_USERNAME'] = 'replay@example.com'
+    app_module.app.config['MAIL_PASSWORD'] = 'replay'
+
+    interval = timedelta(seconds=sweep_interval) if sweep_interval else None
+    next_sweep = trace[0][0] if trace and interval else None
+    latest = {}
+    started = time.perf_counter()
+    try:
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(app_module.app.app_context())
+            if not verbose:
+                # The app logs every send with print(); keep that off the hot loop
+                stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, 'w'))))
+            for moment, metric, value in trace:
+                if speed:
+                    delay = (moment - clock.now()).total_seconds() / speed
+                    if delay > 0:
+                        time.sleep(delay)
+                # Sweeps scheduled before this point see only the values that came before it
+                while next_sweep is not None and next_sweep < moment:
+                    sweep(next_sweep, latest)
+                    next_sweep += interval
+                clock.advance_to(moment)
+                webhooks.deliver_due()
+                track_onset(metric, value, moment)
+                latest[metric] = value
+                if interval is None:
+                    evaluate(metric, value)
+            if next_sweep is not None and trace and next_sweep <= trace[-1][0]:
+                sweep(next_sweep, latest)
+            # Batches still inside their window at the end of the trace go out on schedule
+            webhooks.deliver_due(force=True)
+    finally:
+        (app_module.current_time, app_module.sender_pool, app_module.webhook_dispatcher,
+         app_module.app.config['MAIL_USERNAME'], app_module.app.config['MAIL_PASSWORD']) = saved
+    wall = time.perf_counter() - started
+
+    virtual = (trace[-1][0] - trace[0][0]).total_seconds() if trace else 0.0
+    notifications = [
+        {'channel': 'email', 'virtual_time': m['virtual_time'], 'recipients': m['recipients'],
+         'subject': m['subject']}
+        for m in mailer.messages
+    ] + [
+        {'channel': 'webhook', 'virtual_time': w['virtual_time'], 'url': w['url'],
+         'alert_id': w['event'].get('alert_id')}
+        for w in webhooks.events
+    ]
+    notifications.sort(key=lambda n: n['virtual_time'])
+    return {
+        'trace_points': len(trace),
+        'alerts': sum(len(group) for group in by_type.values()),
+        'alerts_skipped': skipped,
+        'sweep_interval': sweep_interval,
+        'evaluations': evaluations,
+        'triggers': triggers,
+        'emails': len(mailer.messages),
+        'webhooks': len(webhooks.events),
+        'webhook_batches': webhooks.batches,
+        'wall_seconds': round(wall, 4),
+        'virtual_seconds': virtual,
+        'speedup': round(virtual / wall, 1) if wall else None,
+        'evaluations_per_sec': round(evaluations / wall, 1) if wall else None,
+        'latency_seconds': {channel: _summary(values) for channel, values in latencies.items()},
+        'dispatch_ms': _summary(dispatch_ms),
+        'notifications': notifications
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay a metric trace through the AutoAlert Pro pipeline')
+    parser.add_argument('--trace', help='CSV or NDJSON metric trace (default: synthetic)')
+    parser.add_argument('--alerts', help='JSON alert list or db.json-shaped file (default: live db.json)')
+    parser.add_argument('--hours', type=float, default=24, help='length of the synthetic trace')
+    parser.add_argument('--interval', type=float, default=60, help='seconds between synthetic samples')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--speed', type=float, help='virtual seconds per wall second (default: unthrottled)')
+    parser.add_argument('--sweep-interval', type=float,
+                        help='evaluate alerts every N virtual seconds instead of on every point')
+    parser.add_argument('--rearm', action='store_true', help='let alerts fire again after recovering')
+    parser.add_argument('--expect-notifications', type=int,
+                        help='exit non-zero unless exactly this many emails plus webhooks are produced')
+    parser.add_argument('--expect-emails', type=int, help='exit non-zero unless exactly this many emails are sent')
+    parser.add_argument('--expect-webhooks', type=int,
+                        help='exit non-zero unless exactly this many webhook events are delivered')
+    parser.add_argument('--report', help='write the full JSON report here')
+    parser.add_argument('--verbose', action='store_true', help='show the app\'s own log output')
+    args = parser.parse_args(argv)
+
+    rows_skipped = 0
+    if args.trace:
+        trace, rows_skipped = load_trace(args.trace)
+    else:
+        trace = synthetic_trace(hours=args.hours, interval_seconds=args.interval, seed=args.seed)
+    alerts = load_alerts(args.alerts)
+
+    report = replay(trace, alerts, speed=args.speed, rearm=args.rearm,
+                    sweep_interval=args.sweep_interval, verbose=args.verbose)
+    report['trace_rows_skipped'] = rows_skipped
+
+    print(f"🔁 Replayed {report['trace_points']} points ({report['virtual_seconds'] / 3600:.1f}h virtual) "
+          f"against {report['alerts']} alerts in {report['wall_seconds']:.2f}s ({report['speedup']}x real time)")
+    if rows_skipped:
+        print(f"   ⚠️ skipped {rows_skipped} trace rows with a missing or invalid timestamp, type or value")
+    print(f"   {report['evaluations']} evaluations ({report['evaluations_per_sec']}/s), "
+          f"{report['triggers']} triggers, {report['emails']} emails, "
+          f"{report['webhooks']} webhooks in {report['webhook_batches']} batches")
+    for channel, latency in report['latency_seconds'].items():
+        if latency['count']:
+            print(f"   onset-to-{channel} latency (virtual): p50 {latency['p50']}s, "
+                  f"p95 {latency['p95']}s, max {latency['max']}s")
+    dispatch = report['dispatch_ms']
+    print(f"   dispatch_alert wall time: p50 {dispatch['p50']}ms, p95 {dispatch['p95']}ms, max {dispatch['max']}ms")
+
+    if args.report:
+        codec.dump_file(report, args.report, pretty=True)
+        print(f"   report written to {os.path.abspath(args.report)}")
+
+    expectations = (
+        ('notifications', args.expect_notifications, report['emails'] + report['webhooks']),
+        ('emails', args.expect_emails, report['emails']),
+        ('webhooks', args.expect_webhooks, report['webhooks'])
+    )
+    failed = False
+    for label, expected, actual in expectations:
+        if expected is not None and actual != expected:
+            print(f"❌ Expected {expected} {label}, got {actual}")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,425 @@
+import atexit
+import hashlib
+import hmac
+import http.client
+import ipaddress
+import os
+import socket
+import ssl
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import codec
+
+# Webhook notification channel. Events for the same endpoint are collected for
+# up to WEBHOOK_BATCH_WINDOW seconds and delivered together in a single POST,
+# over keep-alive connections that are reused between batches.
+WEBHOOK_BATCH_WINDOW = float(os.environ.get('WEBHOOK_BATCH_WINDOW', '0.25'))
+WEBHOOK_MAX_BATCH = int(os.environ.get('WEBHOOK_MAX_BATCH', '100'))
+WEBHOOK_MAX_RETRIES = int(os.environ.get('WEBHOOK_MAX_RETRIES', '3'))
+WEBHOOK_TIMEOUT = float(os.environ.get('WEBHOOK_TIMEOUT', '5'))
+# Concurrent POSTs in flight overall, and to any single host
+WEBHOOK_MAX_CONCURRENCY = int(os.environ.get('WEBHOOK_MAX_CONCURRENCY', '8'))
+WEBHOOK_ENDPOINT_CONCURRENCY = int(os.environ.get('WEBHOOK_ENDPOINT_CONCURRENCY', '2'))
+# Longest close() waits at exit for queued batches to go out
+WEBHOOK_CLOSE_TIMEOUT = float(os.environ.get('WEBHOOK_CLOSE_TIMEOUT', '10'))
+# Default signing key for alerts that do not carry their own webhook_secret
+WEBHOOK_SECRET = os.environ.get('WEBHOOK_SECRET', '')
+# Comma-separated hostnames webhooks may target. When set, only these hosts are
+# accepted (internal ones included); when empty, any host that resolves to
+# public addresses only is accepted.
+WEBHOOK_ALLOWED_HOSTS = {
+    host.strip().lower() for host in os.environ.get('WEBHOOK_ALLOWED_HOSTS', '').split(',') if host.strip()
+}
+
+SIGNATURE_HEADER = 'X-AutoAlert-Signature'
+TIMESTAMP_HEADER = 'X-AutoAlert-Timestamp'
+
+# Statuses worth retrying; anything else in 4xx means the receiver rejected the batch
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+def resolve_webhook_url(url, allowed_hosts=None):
+    """Resolve the host of `url` to the address webhooks will connect to.
+
+    Returns (address, None), or (None, reason) when the URL may not receive
+    webhooks: loopback, private, link-local (e.g. 169.254.169.254) and other
+    non-public addresses are refused unless the host is explicitly allowlisted.
+    """
+    parts = urlsplit(url or '')
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        return None, 'expected an http(s):// URL'
+    host = parts.hostname.lower()
+    allowed = WEBHOOK_ALLOWED_HOSTS if allowed_hosts is None else allowed_hosts
+    if allowed and host not in allowed:
+        return None, f'host {host} is not in WEBHOOK_ALLOWED_HOSTS'
+    try:
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        addresses = [info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)]
+    except (socket.gaierror, ValueError):
+        return None, f'cannot resolve {host}'
+    if not addresses:
+        return None, f'cannot resolve {host}'
+    if not allowed:
+        for address in addresses:
+            ip = ipaddress.ip_address(address.split('%', 1)[0])
+            if not ip.is_global or ip.is_multicast:
+                return None, f'{host} resolves to non-public address {ip}'
+    return addresses[0], None
+
+
+def check_webhook_url(url, allowed_hosts=None):
+    """Return None if `url` may receive webhooks, otherwise the reason it may not"""
+    return resolve_webhook_url(url, allowed_hosts)[1]
+
+
+def is_valid_webhook_url(url, allowed_hosts=None):
+    return check_webhook_url(url, allowed_hosts) is None
+
+
+def _endpoint(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc.lower()}"
+
+
+def sign_payload(secret, timestamp, body):
+    """HMAC-SHA256 over '<timestamp>.<body>', as sent in the signature header"""
+    digest = hmac.new(secret.encode('utf-8'), f"{timestamp}.".encode('utf-8') + body, hashlib.sha256)
+    return 'sha256=' + digest.hexdigest()
+
+
+def verify_signature(secret, timestamp, body, signature):
+    return hmac.compare_digest(sign_payload(secret, timestamp, body), signature or '')
+
+
+class PinnedHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection to an already-validated `address`, sending requests for `host`"""
+
+    def __init__(self, host, address, timeout=WEBHOOK_TIMEOUT):
+        super().__init__(host, timeout=timeout)
+        self.address = address
+
+    def connect(self):
+        self.sock = socket.create_connection((self.address, self.port), self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class PinnedHTTPSConnection(http.client.HTTPSConnection):
+    """HTTPS connection to `address`; SNI and certificate checks still use `host`"""
+
+    def __init__(self, host, address, timeout=WEBHOOK_TIMEOUT):
+        super().__init__(host, timeout=timeout, context=ssl.create_default_context())
+        self.address = address
+
+    def connect(self):
+        sock = socket.create_connection((self.address, self.port), self.timeout)
+        self.sock = self._context.wrap_socket(sock, server_hostname=self.host)
+
+
+class ConnectionPool:
+    """Idle keep-alive HTTP connections, kept per scheme/host/port and resolved address.
+
+    Connections go to the address the URL was validated against, so a DNS
+    answer that changes between the check and the connect is never used.
+    """
+
+    def __init__(self, max_idle_per_host=WEBHOOK_ENDPOINT_CONCURRENCY, timeout=WEBHOOK_TIMEOUT):
+        self.max_idle_per_host = max_idle_per_host
+        self.timeout = timeout
+        self.idle = {}
+        self.lock = threading.Lock()
+        self.opened = 0
+
+    def get(self, scheme, netloc, address):
+        with self.lock:
+            idle = self.idle.get((scheme, netloc, address))
+            if idle:
+                return idle.pop()
+            self.opened += 1
+        if scheme == 'https':
+            return PinnedHTTPSConnection(netloc, address, timeout=self.timeout)
+        return PinnedHTTPConnection(netloc, address, timeout=self.timeout)
+
+    def put(self, scheme, netloc, address, connection):
+        with self.lock:
+            idle = self.idle.setdefault((scheme, netloc, address), [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        with self.lock:
+            for idle in self.idle.values():
+                for connection in idle:
+                    connection.close()
+            self.idle = {}
+
+
+class WebhookDispatcher:
+    """Batches webhook events per endpoint and delivers them in the background.
+
+    Due batches wait in a per-endpoint queue and are only handed to the worker
+    pool while that endpoint has a free slot, so a slow or dead endpoint ties up
+    at most `endpoint_concurrency` workers and never stalls the others.
+    """
+
+    def __init__(self, batch_window=WEBHOOK_BATCH_WINDOW, max_batch=WEBHOOK_MAX_BATCH,
+                 max_retries=WEBHOOK_MAX_RETRIES, max_concurrency=WEBHOOK_MAX_CONCURRENCY,
+                 endpoint_concurrency=WEBHOOK_ENDPOINT_CONCURRENCY, secret=WEBHOOK_SECRET,
+                 allowed_hosts=None, on_result=None):
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self.max_concurrency = max_concurrency
+        self.endpoint_concurrency = endpoint_concurrency
+        self.secret = secret
+        self.allowed_hosts = allowed_hosts
+        # on_result(events, delivered) runs once per batch, from the thread that posted it
+        self.on_result = on_result
+        self.pool = ConnectionPool(max_idle_per_host=endpoint_concurrency)
+        # (url, secret) -> {'items': [event, ...], 'since': monotonic time of oldest}
+        self.pending = {}
+        # scheme://host:port -> deque of (key, items) batches waiting for a free slot
+        self.ready = {}
+        # scheme://host:port -> batches currently being posted, and the total across hosts
+        self.active = {}
+        self.running = 0
+        self.condition = threading.Condition()
+        self.executor = None
+        self.executor_closed = False
+        self.flusher = None
+        self.stopping = False
+        self.closed = False
+        self.stats = {'queued': 0, 'delivered': 0, 'failed': 0, 'batches': 0, 'retries': 0}
+
+    def _start(self):
+        # Threads start on first use so importing the app stays side-effect free
+        if self.flusher is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                               thread_name_prefix='webhook')
+            self.flusher = threading.Thread(target=self._run, name='webhook-flusher', daemon=True)
+            self.flusher.start()
+            # By the time atexit hooks run the worker pool refuses new work, so
+            # close() posts whatever is still queued from the exiting thread
+            atexit.register(self.close)
+
+    def enqueue(self, url, event, secret=None):
+        """Queue one event for `url`; it is sent with the next batch for that endpoint"""
+        key = (url, secret or self.secret)
+        with self.condition:
+            self._start()
+            entry = self.pending.get(key)
+            if entry is None:
+                # A new batch starts its window now; wake the flusher to time it
+                entry = self.pending[key] = {'items': [], 'since': time.monotonic()}
+                self.condition.notify_all()
+            entry['items'].append(event)
+            self.stats['queued'] += 1
+            if len(entry['items']) >= self.max_batch:
+                self.condition.notify_all()
+
+    def _due_batches(self, force=False):
+        now = time.monotonic()
+        batches = []
+        for key in list(self.pending):
+            entry = self.pending[key]
+            if force or len(entry['items']) >= self.max_batch or now - entry['since'] >= self.batch_window:
+                items = entry['items']
+                while items:
+                    batches.append((key, items[:self.max_batch]))
+                    items = items[self.max_batch:]
+                del self.pending[key]
+        return batches
+
+    def _schedule(self, batches):
+        # Caller holds self.condition
+        for key, items in batches:
+            self.ready.setdefault(_endpoint(key[0]), deque()).append((key, items))
+        self._pump()
+
+    def _claim(self, endpoint):
+        self.active[endpoint] = self.active.get(endpoint, 0) + 1
+        self.running += 1
+
+    def _unclaim(self, endpoint):
+        self.active[endpoint] -= 1
+        if not self.active[endpoint]:
+            del self.active[endpoint]
+        self.running -= 1
+
+    def _pump(self):
+        """Submit queued batches while their endpoint and the pool have room (caller holds the lock)"""
+        for endpoint in list(self.ready):
+            queue = self.ready[endpoint]
+            while (queue and not self.executor_closed and self.running < self.max_concurrency
+                   and self.active.get(endpoint, 0) < self.endpoint_concurrency):
+                key, items = queue.popleft()
+                self._claim(endpoint)
+                try:
+                    self.executor.submit(self._deliver, key, items)
+                except RuntimeError:
+                    # The pool is gone (interpreter shutdown); flush() delivers inline instead
+                    self._unclaim(endpoint)
+                    queue.appendleft((key, items))
+                    self.executor_closed = True
+            if not queue:
+                del self.ready[endpoint]
+
+    def _run(self):
+        while True:
+            with self.condition:
+                if not self.stopping:
+                    self.condition.wait(timeout=self.batch_window if self.pending else None)
+                self._schedule(self._due_batches(force=self.stopping))
+                if self.stopping:
+                    return
+
+    def _deliver(self, key, items, max_retries=None):
+        """Post one batch; the caller has already claimed a slot for its endpoint"""
+        url, secret = key
+        delivered = False
+        try:
+            delivered = self._post_with_retries(url, secret, items,
+                                                self.max_retries if max_retries is None else max_retries)
+        except Exception as e:
+            print(f"❌ Webhook delivery to {url} crashed: {e}")
+        try:
+            if self.on_result is not None:
+                try:
+                    self.on_result(items, delivered)
+                except Exception as e:
+                    print(f"❌ Webhook result callback failed: {e}")
+        finally:
+            with self.condition:
+                self.stats['batches'] += 1
+                self.stats['delivered' if delivered else 'failed'] += len(items)
+                self._unclaim(_endpoint(url))
+                self._pump()
+                self.condition.notify_all()
+
+    def _post_with_retries(self, url, secret, events, max_retries):
+        # Resolved and checked once per batch; every attempt connects to this address
+        address, problem = resolve_webhook_url(url, self.allowed_hosts)
+        if problem:
+            print(f"❌ Refusing webhook delivery to {url}: {problem}")
+            return False
+
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        body = codec.dumps({'events': events, 'count': len(events)})
+
+        for attempt in range(max_retries + 1):
+            if attempt:
+                with self.condition:
+                    self.stats['retries'] += 1
+                time.sleep(min(0.2 * (2 ** (attempt - 1)), 5.0))
+
+            timestamp = str(int(time.time()))
+            headers = {
+                'Content-Type': 'application/json',
+                'User-Agent': 'AutoAlert-Pro-Webhook',
+                TIMESTAMP_HEADER: timestamp
+            }
+            if secret:
+                headers[SIGNATURE_HEADER] = sign_payload(secret, timestamp, body)
+
+            connection = self.pool.get(parts.scheme, parts.netloc, address)
+            try:
+                connection.request('POST', path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                print(f"⚠️ Webhook POST to {url} failed (attempt {attempt + 1}): {e}")
+                continue
+
+            if response.will_close:
+                connection.close()
+            else:
+                self.pool.put(parts.scheme, parts.netloc, address, connection)
+
+            if 200 <= response.status < 300:
+                return True
+            if response.status not in RETRY_STATUSES:
+                print(f"❌ Webhook {url} rejected batch of {len(events)}: HTTP {response.status}")
+                return False
+            print(f"⚠️ Webhook {url} answered HTTP {response.status} (attempt {attempt + 1})")
+
+        print(f"❌ Giving up on webhook batch of {len(events)} for {url}")
+        return False
+
+    def flush(self, timeout=None):
+        """Send everything queued now and wait for in-flight batches to finish.
+
+        Returns False if `timeout` seconds pass first. Once the worker pool has
+        been shut down, remaining batches are posted from the calling thread
+        with a single attempt each.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            inline = None
+            with self.condition:
+                if self.flusher is None:
+                    return True
+                if self.pending:
+                    self._schedule(self._due_batches(force=True))
+                if not self.ready and not self.running:
+                    return True
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                if self.executor_closed and self.ready:
+                    endpoint = next(iter(self.ready))
+                    queue = self.ready[endpoint]
+                    inline = queue.popleft()
+                    if not queue:
+                        del self.ready[endpoint]
+                    self._claim(endpoint)
+                else:
+                    self.condition.wait(timeout=remaining)
+            if inline is not None:
+                self._deliver(*inline, max_retries=0)
+
+    def undelivered(self):
+        with self.condition:
+            queued = sum(len(entry['items']) for entry in self.pending.values())
+            queued += sum(len(items) for queue in self.ready.values() for _, items in queue)
+            return queued
+
+    def close(self, timeout=WEBHOOK_CLOSE_TIMEOUT):
+        """Stop the flusher and deliver what is queued, waiting at most `timeout` seconds"""
+        with self.condition:
+            if self.flusher is None or self.closed:
+                return
+            self.closed = True
+            self.stopping = True
+            self.condition.notify_all()
+        deadline = time.monotonic() + timeout
+        self.flusher.join(timeout)
+        if not self.flush(timeout=max(0.0, deadline - time.monotonic())):
+            print(f"⚠️ Webhook shutdown timed out with {self.undelivered()} event(s) undelivered")
+        self.executor.shutdown(wait=False)
+        self.pool.close()
+
+
+def build_alert_event(alert, threshold_value, current_value, severity, urgency, triggered_at=None):
+    """Payload for one triggered alert, as delivered inside a webhook batch"""
+    return {
+        'id': uuid.uuid4().hex,
+        'alert_id': alert.get('id'),
+        'type': alert.get('type'),
+        'threshold': threshold_value,
+        'current_value': current_value,
+        'severity': severity,
+        'urgency': urgency,
+        'email': alert.get('email'),
+        'triggered_at': (triggered_at or datetime.now()).isoformat()
+    }